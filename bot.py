@@ -1,13 +1,18 @@
 import logging
 import logging.config
 from hydrogram import Client, __version__, idle
+from hydrogram.errors import FloodWait
 from hydrogram.raw.all import layer
 from database.users_chats_db import db
-from info import API_ID, API_HASH, BOT_TOKEN, AUTH_CHANNEL
+from database.ia_filterdb import ensure_indexes, backfill_search_fields, watch_db_sizes
+from info import API_ID, API_HASH, BOT_TOKEN, AUTH_CHANNEL, TG_RATE, TG_CHAT_RATE, TG_BACKGROUND_RESERVE
+from ratelimit import RateLimiter, peer_id
 from utils import temp
 from typing import Union, Optional, AsyncGenerator
 from hydrogram import types
 import asyncio
+import contextvars
+import time
 import sys
 
 logging.basicConfig(
@@ -34,6 +39,17 @@ try:
 except ImportError:
     logger.info("tgcrypto not available - bot will work without it (slower encryption)")
 
+# History scans: message ids per get_messages call (Telegram allows 200), the
+# floor FloodWait can shrink it to, and how many windows are fetched ahead
+SCAN_BATCH_SIZE = 200
+SCAN_MIN_BATCH_SIZE = 25
+SCAN_PREFETCH = 3
+# get_messages calls in flight across all concurrent scans
+SCAN_CONCURRENCY = 2
+# Cleared by callers that handle FloodWait themselves (history scans shrink
+# their batch), so Bot.invoke raises it instead of sleeping and retrying
+SLEEP_ON_FLOOD = contextvars.ContextVar('sleep_on_flood', default=True)
+
 class Bot(Client):
     def __init__(self):
         super().__init__(
@@ -45,10 +61,18 @@ class Bot(Client):
             sleep_threshold=10,
             workers=200
         )
+        # Concurrent scans share one Telegram budget: a cap on calls in flight
+        # and a FloodWait deadline that pauses every scan, not just the one hit
+        self.scan_slots = asyncio.Semaphore(SCAN_CONCURRENCY)
+        self.scan_flood_until = 0
+        # Every API call waits for the shared limiter, which slows the
+        # method (and chat) down whenever Telegram answers with FloodWait
+        self.limiter = RateLimiter(TG_RATE, TG_CHAT_RATE, reserve=TG_BACKGROUND_RESERVE)
 
     async def start(self):
         await super().start()
         stg = await db.get_sttg()
+        logger.info(f"Loaded {await db.load_join_reqs()} join requests")
         
         # Use test channels instead of database stored channels
         from info import AUTH_CHANNEL, CHANNELS
@@ -67,15 +91,59 @@ class Bot(Client):
         self.username = '@' + me.username
         logger.info(f"bot started - @{me.username}")
 
+        # Search indexes; older documents get their search fields in the background
+        await ensure_indexes()
+        asyncio.create_task(backfill_search_fields())
+        asyncio.create_task(watch_db_sizes())
+
+        # Indexing jobs interrupted by a restart continue from their checkpoint
+        from plugins.index import resume_index_jobs
+        asyncio.create_task(resume_index_jobs(self))
+
+        # Posts made to the movie channels while offline are indexed from each channel's mark
+        from plugins.channel import catch_up_channels
+        asyncio.create_task(catch_up_channels(self))
+
+        # Channel memberships: stored table plus what Telegram lets us list
+        from plugins.join_req import bootstrap_membership
+        asyncio.create_task(bootstrap_membership(self))
+
+        # The bot's access to the required channels, checked once here instead of per user
+        from plugins.simple_channel_handler import ENABLE_CHANNEL_CHECKING, watch_channel_status
+        if ENABLE_CHANNEL_CHECKING:
+            asyncio.create_task(watch_channel_status(self))
+
     async def stop(self):
+        # Uploads still waiting in the ingest buffer are written before disconnecting
+        from plugins.channel import drain_ingest
+        await drain_ingest()
         await super().stop()
         logger.info("Bot stopped. Bye.")
     
+    async def invoke(self, query, *args, sleep_threshold=None, **kwargs):
+        # The session would sleep through short FloodWaits itself and the
+        # limiter would never hear of them, so they are handled here instead
+        method = type(query).__name__
+        chat = peer_id(query)
+        if sleep_threshold is None:
+            sleep_threshold = self.sleep_threshold
+        while True:
+            await self.limiter.acquire(method, chat)
+            try:
+                return await super().invoke(query, *args, sleep_threshold=0, **kwargs)
+            except FloodWait as e:
+                self.limiter.penalize(method, chat, e.value)
+                if e.value > sleep_threshold or not SLEEP_ON_FLOOD.get():
+                    raise
+                logger.warning(f"Waiting {e.value}s before retrying {method} (FloodWait)")
+                await asyncio.sleep(e.value)
+
     async def iter_messages(
         self,
         chat_id: Union[int, str],
         limit: int,
         offset: int = 0,
+        stats: Optional[dict] = None,
     ) -> Optional[AsyncGenerator["types.Message", None]]:
         """Iterate through a chat sequentially.
         This convenience method does the same as repeatedly calling :meth:`~pyrogram.Client.get_messages` in a loop, thus saving
@@ -93,6 +161,15 @@ class Bot(Client):
             offset (``int``, *optional*):
                 Identifier of the first message to be returned.
                 Defaults to 0.
+
+            stats (``dict``, *optional*):
+                Filled in while iterating with fetched/processed message counts, the time
+                spent fetching and processing, and the current batch size.
+
+        Windows of up to 200 ids are fetched in a background task and kept in a small
+        bounded queue, so the next windows are downloaded while the caller handles the
+        current one. A FloodWait halves the window size; it grows back after a run of
+        clean fetches.
         Returns:
             ``Generator``: A generator yielding :obj:`~pyrogram.types.Message` objects.
         Example:
@@ -100,15 +177,62 @@ class Bot(Client):
                 for message in app.iter_messages("pyrogram", 1, 15000):
                     print(message.text)
         """
-        current = offset
-        while True:
-            new_diff = min(200, limit - current)
-            if new_diff <= 0:
-                return
-            messages = await self.get_messages(chat_id, list(range(current, current+new_diff+1)))
-            for message in messages:
-                yield message
-                current += 1
+        stats = {} if stats is None else stats
+        stats.update(fetched=0, processed=0, fetch_time=0.0, process_time=0.0, batch_size=SCAN_BATCH_SIZE)
+        queue = asyncio.Queue(maxsize=SCAN_PREFETCH)
+
+        async def fetch():
+            # This task's own context: its FloodWaits come back here
+            SLEEP_ON_FLOOD.set(False)
+            current = offset
+            clean = 0
+            try:
+                while current <= limit:
+                    size = min(stats['batch_size'], limit - current + 1)
+                    wait = self.scan_flood_until - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    started = time.monotonic()
+                    try:
+                        async with self.scan_slots:
+                            messages = await self.get_messages(chat_id, list(range(current, current + size)))
+                    except FloodWait as e:
+                        stats['batch_size'] = max(SCAN_MIN_BATCH_SIZE, stats['batch_size'] // 2)
+                        clean = 0
+                        self.scan_flood_until = max(self.scan_flood_until, time.monotonic() + e.value)
+                        logger.warning(f"FloodWait of {e.value}s while scanning {chat_id}, batch size now {stats['batch_size']}")
+                        continue
+                    stats['fetch_time'] += time.monotonic() - started
+                    stats['fetched'] += len(messages)
+                    current += size
+                    clean += 1
+                    if clean >= 5 and stats['batch_size'] < SCAN_BATCH_SIZE:
+                        stats['batch_size'] = min(SCAN_BATCH_SIZE, stats['batch_size'] * 2)
+                        clean = 0
+                    await queue.put(messages)
+                await queue.put(None)
+            except Exception as e:
+                await queue.put(e)
+
+        producer = asyncio.create_task(fetch())
+        try:
+            while True:
+                messages = await queue.get()
+                if messages is None:
+                    return
+                if isinstance(messages, Exception):
+                    raise messages
+                for message in messages:
+                    started = time.monotonic()
+                    yield message
+                    stats['process_time'] += time.monotonic() - started
+                    stats['processed'] += 1
+        finally:
+            producer.cancel()
+            logger.info(
+                f"Scanned {chat_id}: fetched {stats['fetched']} messages in {stats['fetch_time']:.1f}s, "
+                f"processed {stats['processed']} in {stats['process_time']:.1f}s"
+            )
 
 
 async def main():
@@ -0,0 +1,137 @@
+import time
+import asyncio
+from collections import OrderedDict
+
+# Every cache and singleflight group registers itself here so admins can
+# inspect them with /cachestats
+CACHES = {}
+FLIGHTS = {}
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Bounded least-recently-used mapping with optional per-entry expiry
+
+    Capacity is counted in entries, or in whatever unit ``sizeof`` returns
+    for a value (e.g. approximate bytes) when it is given.
+    """
+
+    def __init__(self, name, maxsize, ttl=None, sizeof=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.weight = 0
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        CACHES[name] = self
+
+    def _weigh(self, value):
+        return self.sizeof(value) if self.sizeof else 1
+
+    def _remove(self, key):
+        value, expires, weight = self._data.pop(key)
+        self.weight -= weight
+        return value
+
+    def get(self, key, default=None):
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        value, expires, weight = entry
+        if expires is not None and expires < time.monotonic():
+            self._remove(key)
+            self.expired += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        if key in self._data:
+            self._remove(key)
+        self._purge_expired()
+        weight = self._weigh(value)
+        self._data[key] = (value, expires, weight)
+        self.weight += weight
+        while self.weight > self.maxsize and len(self._data) > 1:
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def _purge_expired(self):
+        # The oldest entries sit at the front, so expired ones are dropped
+        # from there until a live entry is reached
+        now = time.monotonic()
+        while self._data:
+            key, (value, expires, weight) = next(iter(self._data.items()))
+            if expires is None or expires >= now:
+                break
+            self._remove(key)
+            self.expired += 1
+
+    def pop(self, key, default=None):
+        if key not in self._data:
+            return default
+        return self._remove(key)
+
+    def clear(self):
+        self._data.clear()
+        self.weight = 0
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'weight': self.weight,
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expired': self.expired,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class SingleFlight:
+    """Coalesce concurrent calls: while a call for a key is running, callers
+    with the same key await its result instead of starting their own"""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self.calls = 0
+        self.coalesced = 0
+        FLIGHTS[name] = self
+
+    async def do(self, key, func, *args, **kwargs):
+        future = self._calls.get(key)
+        if future is None:
+            self.calls += 1
+            future = asyncio.ensure_future(func(*args, **kwargs))
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._calls.pop(key, None) if self._calls.get(key) is done else None)
+        else:
+            self.coalesced += 1
+        # Shielded so one caller giving up does not cancel the shared call
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return {
+            'in_flight': len(self._calls),
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+        }
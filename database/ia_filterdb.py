@@ -1,37 +1,265 @@
 import logging
+import asyncio
+import time
 from struct import pack
 import re
 import base64
+import bson
 from hydrogram.file_id import FileId
-from pymongo.errors import DuplicateKeyError, OperationFailure
-from pymongo import MongoClient, ASCENDING
-from info import DATABASE_URL, DATABASE_NAME, COLLECTION_NAME, FILE_DB_URL, FILE_DB_NAME
+from pymongo.errors import DuplicateKeyError, OperationFailure, BulkWriteError
+from pymongo import ASCENDING, UpdateOne, InsertOne
+from motor.motor_asyncio import AsyncIOMotorClient
+from cache import LRUCache, SingleFlight
+from info import DATABASE_URL, DATABASE_NAME, COLLECTION_NAME, FILE_DB_URL, FILE_DB_NAME, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, FILE_CACHE_SIZE, FILE_LOCATION_CACHE_SIZE, PRIMARY_DB_LIMIT, DB_SIZE_REFRESH
 
 logger = logging.getLogger(__name__)
 
 # Primary database connection (your new database)
-primary_client = MongoClient(DATABASE_URL)
+primary_client = AsyncIOMotorClient(DATABASE_URL)
 primary_db = primary_client[DATABASE_NAME]
 primary_col = primary_db[COLLECTION_NAME]
 
 # Secondary database connection (same as primary for now)
-secondary_client = MongoClient(FILE_DB_URL)
+secondary_client = AsyncIOMotorClient(FILE_DB_URL)
 secondary_db = secondary_client[FILE_DB_NAME]
 secondary_col = secondary_db[COLLECTION_NAME]
 
+COLLECTIONS = {'primary': primary_col, 'secondary': secondary_col}
+
+# Searches read the secondary catalog first, like the reversed combined list
+# used to, and list each catalog newest upload first by indexed_at. When both
+# settings point at one collection it is only read once.
+SHARED_COLLECTION = (FILE_DB_URL, FILE_DB_NAME) == (DATABASE_URL, DATABASE_NAME)
+if SHARED_COLLECTION:
+    search_locations = ['primary']
+    catalog_locations = [('primary', primary_col)]
+else:
+    search_locations = ['secondary', 'primary']
+    catalog_locations = [('primary', primary_col), ('secondary', secondary_col)]
+search_cols = [COLLECTIONS[location] for location in search_locations]
+
+# Capacity routing: new files go to the primary until its dataSize reaches
+# PRIMARY_DB_LIMIT, then to the secondary, so the quota error is never the
+# trigger. Sizes are sampled every DB_SIZE_REFRESH seconds and bumped by each
+# write in between. file_locations remembers which database holds an _id so
+# point reads and deletes only touch that one.
+db_sizes = {'primary': 0, 'secondary': 0}
+file_locations = LRUCache('file_locations', FILE_LOCATION_CACHE_SIZE)
+
+# Fields needed to render a result button or an inline result
+RESULT_PROJECTION = {'_id': 1, 'file_name': 1, 'file_size': 1}
+# Fields a search session needs to filter results without going back to Mongo
+FACET_PROJECTION = {'_id': 1, 'languages': 1, 'resolution': 1, 'is_series': 1}
+
+# Recent searches keyed by (sorted query tokens, file_type). Every catalog write
+# bumps catalog_version and clears it; a search that raced with a write is not
+# stored, so stale results never outlive the write that made them stale.
+search_cache = LRUCache('search_results', SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+catalog_version = 0
+# Projected result documents by _id, so rendering a cached page needs no query
+files_cache = LRUCache('result_files', FILE_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+# Identical searches arriving together (a title announced in a big group)
+# share one database round trip
+search_flight = SingleFlight('search')
+# Collections whose unique (file_name, file_size) and file_unique_id indexes
+# exist; save_file lets those indexes report duplicates instead of looking first
+unique_keys = set()
+
+# Token pattern shared by indexing and searching. Underscores are split too,
+# matching the separators save_file already turns into spaces.
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+
+# Values the result filters offer; parse_file_name stores the ones it finds
+RESOLUTIONS = ['480p', '540p', '720p', '1080p', '2160p']
+LANGUAGES = ['english', 'tamil', 'hindi', 'malayalam', 'telugu', 'korean', 'sinhala']
+EPISODE_PATTERN = re.compile(r's(\d{1,2})e(\d{1,2})', re.IGNORECASE)
+YEAR_PATTERN = re.compile(r'\b(19\d{2}|20\d{2})\b')
+
+
+def get_name_tokens(file_name):
+    """Return the normalized, de-duplicated search tokens of a file name"""
+    return list(dict.fromkeys(TOKEN_PATTERN.findall(str(file_name).lower())))
+
+
+def parse_file_name(file_name):
+    """Extract the structured fields that result filters query on"""
+    file_name = str(file_name)
+    lowered = file_name.lower()
+    episode = EPISODE_PATTERN.search(lowered)
+    year = YEAR_PATTERN.search(lowered)
+    positions = sorted((lowered.find(res), res) for res in RESOLUTIONS if res in lowered)
+    resolution = positions[0][1] if positions else None
+
+    # The title is whatever precedes the first year, episode or resolution tag
+    cut = min([m.start() for m in (episode, year) if m] + [pos for pos, _ in positions[:1]], default=len(file_name))
+    title = ' '.join(re.sub(r'[\[\](){}]', ' ', file_name[:cut]).split()) or ' '.join(file_name.split())
+
+    return {
+        'title': title,
+        'year': int(year.group(1)) if year else None,
+        'resolution': resolution,
+        'languages': [lang for lang in LANGUAGES if lang in lowered],
+        'season': int(episode.group(1)) if episode else None,
+        'episode': int(episode.group(2)) if episode else None,
+        'is_series': bool(episode)
+    }
+
+
+def file_document(file_id, file_name, file_size, media):
+    """Build the catalog document stored for a media file"""
+    document = {
+        '_id': file_id,
+        'file_name': file_name,
+        'file_size': file_size,
+        'file_type': getattr(media, 'file_type', 'unknown'),
+        'file_unique_id': getattr(media, 'file_unique_id', None),
+        'tokens': get_name_tokens(file_name),
+        # Ingest time; results are listed newest first on it
+        'indexed_at': time.time()
+    }
+    document.update(parse_file_name(file_name))
+    return document
+
+
+def invalidate_search_cache(*removed_ids):
+    """Drop cached searches after the catalog changed, plus any removed files"""
+    global catalog_version
+    catalog_version += 1
+    search_cache.clear()
+    for file_id in removed_ids:
+        files_cache.pop(file_id)
+        file_locations.pop(file_id)
+
+
+def write_location():
+    """Database new files are written to"""
+    if SHARED_COLLECTION or db_sizes['primary'] < PRIMARY_DB_LIMIT:
+        return 'primary'
+    return 'secondary'
+
+
+def file_location(file_id):
+    """Database known to hold file_id, None if unknown"""
+    return 'primary' if SHARED_COLLECTION else file_locations.get(file_id)
+
+
+def record_write(location, *documents):
+    for document in documents:
+        if not SHARED_COLLECTION:
+            file_locations.set(document['_id'], location)
+        db_sizes[location] += len(bson.encode(document))
+
+
+async def watch_db_sizes():
+    """Keep db_sizes in step with the databases' real dataSize"""
+    while True:
+        try:
+            db_sizes['primary'], db_sizes['secondary'] = await get_database_size()
+        except Exception as e:
+            logger.error(f"Error reading database sizes: {e}")
+        await asyncio.sleep(DB_SIZE_REFRESH)
+
+
+def media_document(media):
+    """Build the catalog document for a media object, None if it has no file_id"""
+    if not getattr(media, 'file_id', None):
+        return None
+
+    try:
+        file_id, file_ref = unpack_new_file_id(media.file_id)
+    except Exception as e:
+        logger.error(f"Error processing file_id: {e}")
+        # Fallback: use the original file_id if processing fails
+        file_id = media.file_id
 
+    if getattr(media, 'file_name', None):
+        file_name = re.sub(r"(_|\-|\.|\+)", " ", str(media.file_name))
+    else:
+        # Generate a filename if missing
+        file_name = f"Movie_{getattr(media, 'file_unique_id', 'unknown')}"
+        if hasattr(media, 'file_type'):
+            file_name += f".{media.file_type}"
+        logger.info(f"Generated filename: {file_name}")
 
-def get_database_size():
+    return file_document(file_id, file_name, getattr(media, 'file_size', 0), media)
+
+
+async def ensure_indexes():
+    """Create the search and uniqueness indexes on both collections"""
+    for location, col in (('primary', primary_col), ('secondary', secondary_col)):
+        try:
+            # tokens is the only array field, so the filters can share its index
+            await col.create_index(
+                [('tokens', ASCENDING), ('resolution', ASCENDING), ('is_series', ASCENDING)],
+                name='tokens_1_resolution_1_is_series_1'
+            )
+            await col.create_index([('languages', ASCENDING)], name='languages_1')
+        except Exception as e:
+            logger.error(f"Error creating search indexes: {e}")
+        try:
+            # One document per Telegram file, whatever path ingested it
+            await col.create_index(
+                [('file_unique_id', ASCENDING)],
+                name='file_unique_id_1',
+                unique=True,
+                partialFilterExpression={'file_unique_id': {'$type': 'string'}}
+            )
+            # Same name and size is the same file, possibly under an expired id
+            await col.create_index(
+                [('file_name', ASCENDING), ('file_size', ASCENDING)],
+                name='file_name_1_file_size_1',
+                unique=True
+            )
+            unique_keys.add(location)
+        except Exception as e:
+            logger.error(f"Error creating unique file indexes: {e}")
+
+
+async def backfill_search_fields(batch_size=1000):
+    """Add tokens and parsed name fields to documents saved before they existed"""
+    updated = 0
+    missing = {'$or': [
+        {'tokens': {'$exists': False}}, {'is_series': {'$exists': False}}, {'indexed_at': {'$exists': False}}
+    ]}
+    for col in (primary_col, secondary_col):
+        requests = []
+        # Older files get their position in insertion order as indexed_at, which
+        # keeps their order and sorts them below every timestamped upload
+        position = 0
+        async for doc in col.find(missing, {'file_name': 1, 'indexed_at': 1}):
+            file_name = doc.get('file_name', '')
+            fields = parse_file_name(file_name)
+            fields['tokens'] = get_name_tokens(file_name)
+            if 'indexed_at' not in doc:
+                fields['indexed_at'] = position
+                position += 1
+            requests.append(UpdateOne({'_id': doc['_id']}, {'$set': fields}))
+            if len(requests) >= batch_size:
+                updated += (await col.bulk_write(requests, ordered=False)).modified_count
+                requests = []
+        if requests:
+            updated += (await col.bulk_write(requests, ordered=False)).modified_count
+    if updated:
+        invalidate_search_cache()
+        logger.info(f"Backfilled search fields on {updated} files")
+    return updated
+
+
+async def get_database_size():
     """Get total size of data in both databases"""
-    primary_size = primary_db.command("dbstats")['dataSize']
-    secondary_size = secondary_db.command("dbstats")['dataSize']
-    return primary_size, secondary_size
+    primary_stats, secondary_stats = await asyncio.gather(
+        primary_db.command("dbstats"),
+        secondary_db.command("dbstats")
+    )
+    return primary_stats['dataSize'], secondary_stats['dataSize']
 
-def get_database_count():
+async def get_database_count():
     """Get total count of files in both databases"""
-    primary_count = primary_col.count_documents({})
-    secondary_count = secondary_col.count_documents({})
-    return primary_count, secondary_count
+    return await asyncio.gather(
+        primary_col.count_documents({}),
+        secondary_col.count_documents({})
+    )
 
 async def save_file(media):
     """Save file to available database with enhanced error handling and duplicate management"""
@@ -43,103 +271,59 @@ async def save_file(media):
         logger.info(f"File name: {getattr(media, 'file_name', 'Missing')}")
         logger.info(f"File size: {getattr(media, 'file_size', 'Missing')}")
         
-        # Get file ID
-        if not hasattr(media, 'file_id') or not media.file_id:
+        document = media_document(media)
+        if document is None:
             logger.error("Media object missing file_id")
             return False, 3
-            
-        # Process file ID
-        try:
-            file_id, file_ref = unpack_new_file_id(media.file_id)
-            logger.info(f"Processed file_id: {file_id}")
-        except Exception as e:
-            logger.error(f"Error processing file_id: {e}")
-            # Fallback: use the original file_id if processing fails
-            file_id = media.file_id
-            logger.info(f"Using original file_id as fallback: {file_id}")
-        
-        # Process file name
-        if hasattr(media, 'file_name') and media.file_name:
-            file_name = re.sub(r"(_|\-|\.|\+)", " ", str(media.file_name))
-        else:
-            # Generate a filename if missing
-            file_name = f"Movie_{getattr(media, 'file_unique_id', 'unknown')}"
-            if hasattr(media, 'file_type'):
-                file_name += f".{media.file_type}"
-            logger.info(f"Generated filename: {file_name}")
 
-        file_size = getattr(media, 'file_size', 0)
-        
-        # Check for existing file by name and size
-        existing_file, database_location = await find_duplicate_by_name_and_size(file_name, file_size)
+        file_id = document['_id']
+        file_name = document['file_name']
+        logger.info(f"Processed file_id: {file_id}")
         
-        if existing_file:
-            old_file_id = existing_file['_id']
+        logger.info(f"Document to save: {document}")
+
+        try:
+            # With the unique indexes in place a new file is a single insert and
+            # a duplicate is reported by the insert itself. The secondary catalog
+            # has no say in primary inserts, so it is still checked up front.
+            existing_file = None
+            if not (SHARED_COLLECTION and 'primary' in unique_keys):
+                existing_file = await find_existing_file(document)
+            if existing_file is None:
+                location = write_location()
+                try:
+                    result = await COLLECTIONS[location].insert_one(document)
+                    record_write(location, document)
+                    invalidate_search_cache()
+                    logger.info(f'{file_name} saved to {location} database with ID: {result.inserted_id}')
+                    return True, 1
+                except DuplicateKeyError as e:
+                    if '_id' in (e.details or {}).get('keyPattern', {'_id': 1}):
+                        logger.warning(f'{file_name} already exists in {location} database with same file ID')
+                        return False, 0
+                existing_file = await find_existing_file(document)
+                if existing_file is None:
+                    return False, 0
+
+            old_file_id, database_location = existing_file
             logger.info(f"Found existing file: {file_name} with old ID: {old_file_id}")
-            
+
             # If it's the same file ID, no update needed
             if old_file_id == file_id:
                 logger.info(f"File {file_name} already has current ID")
                 return False, 0
-            
+
             # Update the existing file with new ID (refresh expired ID)
             logger.info(f"Updating file ID from {old_file_id} to {file_id}")
-            
-            try:
-                if database_location == 'primary':
-                    # Remove old entry and insert new one
-                    primary_col.delete_one({'_id': old_file_id})
-                    document = {
-                        '_id': file_id,
-                        'file_name': file_name,
-                        'file_size': file_size,
-                        'file_type': getattr(media, 'file_type', 'unknown'),
-                        'file_unique_id': getattr(media, 'file_unique_id', None)
-                    }
-                    primary_col.insert_one(document)
-                    logger.info(f"✅ Updated {file_name} with fresh file ID in primary database")
-                    return True, 5  # Return code 5 for "updated existing file"
-                    
-                else:  # secondary
-                    # Remove old entry and insert new one
-                    secondary_col.delete_one({'_id': old_file_id})
-                    document = {
-                        '_id': file_id,
-                        'file_name': file_name,
-                        'file_size': file_size,
-                        'file_type': getattr(media, 'file_type', 'unknown'),
-                        'file_unique_id': getattr(media, 'file_unique_id', None)
-                    }
-                    secondary_col.insert_one(document)
-                    logger.info(f"✅ Updated {file_name} with fresh file ID in secondary database")
-                    return True, 5  # Return code 5 for "updated existing file"
-                    
-            except Exception as update_error:
-                logger.error(f"Error updating existing file: {update_error}")
-                # Continue with normal save process if update fails
-
-        # Create document for database
-        document = {
-            '_id': file_id,
-            'file_name': file_name,
-            'file_size': file_size,
-            'file_type': getattr(media, 'file_type', 'unknown'),
-            'file_unique_id': getattr(media, 'file_unique_id', None)
-        }
-        
-        logger.info(f"Document to save: {document}")
-
-        # Try to save to primary database
-        try:
-            result = primary_col.insert_one(document)
-            logger.info(f'{file_name} saved to primary database with ID: {result.inserted_id}')
-            return True, 1
-        except DuplicateKeyError:
-            logger.warning(f'{file_name} already exists in primary database with same file ID')
-            return False, 0
+            await replace_file_id(database_location, old_file_id, document)
+            invalidate_search_cache(old_file_id)
+            record_write(database_location, document)
+            logger.info(f"✅ Updated {file_name} with fresh file ID in {database_location} database")
+            return True, 5  # Return code 5 for "updated existing file"
         except OperationFailure as e:
             if 'quota' in str(e).lower():
                 logger.warning("Primary database over quota, trying secondary")
+                db_sizes['primary'] = max(db_sizes['primary'], PRIMARY_DB_LIMIT)
                 return await save_to_secondary(document, file_name)
             else:
                 logger.error(f"Primary database operation error: {e}")
@@ -155,13 +339,193 @@ async def save_file(media):
         return False, 4
 
 
+async def find_existing_file(document):
+    """Find the stored copy of a file by id, file_unique_id or name and size.
+
+    Returns (file_id, 'primary'|'secondary') or None; primary wins.
+    """
+    same_file = [
+        {'_id': document['_id']},
+        {'file_name': document['file_name'], 'file_size': document['file_size']}
+    ]
+    if document.get('file_unique_id'):
+        same_file.append({'file_unique_id': document['file_unique_id']})
+    locations = catalog_locations
+    found = await asyncio.gather(*(
+        col.find_one({'$or': same_file}, {'_id': 1}) for _, col in locations
+    ))
+    for (location, _), doc in zip(locations, found):
+        if doc:
+            return doc['_id'], location
+    return None
+
+
+async def replace_file_id(location, old_file_id, document):
+    """Swap a stored file's id for its fresh one, see replace_file_ids"""
+    await replace_file_ids(location, [(old_file_id, document)])
+
+
+async def replace_file_ids(location, replacements):
+    """Swap stored files' ids for their fresh ones in a single transaction, so
+    searches never see a file missing. replacements are (old_file_id, document)
+    pairs. Standalone servers without transactions fall back to delete then
+    insert."""
+    client, col = (primary_client, primary_col) if location == 'primary' else (secondary_client, secondary_col)
+    old_file_ids = [old_file_id for old_file_id, _ in replacements]
+    documents = [document for _, document in replacements]
+    try:
+        async with await client.start_session() as session:
+            async with session.start_transaction():
+                await col.delete_many({'_id': {'$in': old_file_ids}}, session=session)
+                await col.insert_many(documents, session=session)
+    except OperationFailure as e:
+        # IllegalOperation: transactions need a replica set
+        if e.code != 20:
+            raise
+        await col.delete_many({'_id': {'$in': old_file_ids}})
+        await col.insert_many(documents, ordered=False)
+
+
+async def save_files(media_list):
+    """Save a batch of media with one duplicate lookup and unordered bulk writes
+
+    Returns one (saved, code) tuple per media, using the same codes as
+    save_file: 1 saved, 5 refreshed an existing file's id, 0 duplicate,
+    2 database error, 3 missing file_id, 4 unexpected error.
+    """
+    results = [(False, 2)] * len(media_list)
+    documents = {}
+    seen_ids, seen_keys = set(), set()
+    for index, media in enumerate(media_list):
+        try:
+            document = media_document(media)
+        except Exception as e:
+            logger.error(f"Error preparing {getattr(media, 'file_name', None)}: {e}")
+            results[index] = (False, 4)
+            continue
+        if document is None:
+            results[index] = (False, 3)
+            continue
+        # Repeats inside the batch are duplicates of the first occurrence
+        key = (document['file_name'], document['file_size'])
+        if document['_id'] in seen_ids or key in seen_keys:
+            results[index] = (False, 0)
+            continue
+        seen_ids.add(document['_id'])
+        seen_keys.add(key)
+        documents[index] = document
+
+    if not documents:
+        return results
+
+    # One lookup per database covers both the id and the name+size checks
+    lookup = {'$or': [
+        {'_id': {'$in': list(seen_ids)}},
+        {'file_name': {'$in': list({name for name, size in seen_keys})}}
+    ]}
+    locations = catalog_locations
+    found = await asyncio.gather(*(
+        col.find(lookup, {'_id': 1, 'file_name': 1, 'file_size': 1}).to_list(length=None)
+        for _, col in locations
+    ))
+    existing_ids = set()
+    existing_keys = {}
+    for (location, _), docs in zip(locations, found):
+        for doc in docs:
+            existing_ids.add(doc['_id'])
+            existing_keys.setdefault((doc['file_name'], doc.get('file_size')), (doc['_id'], location))
+
+    writes = {location: [] for location, _ in locations}
+    refreshed = []
+    for index, document in documents.items():
+        if document['_id'] in existing_ids:
+            results[index] = (False, 0)
+            continue
+        old = existing_keys.get((document['file_name'], document['file_size']))
+        if old:
+            # Same file under an expired id: swap the id in place
+            old_file_id, location = old
+            writes[location].append((index, 5, document, old_file_id))
+            refreshed.append(old_file_id)
+        else:
+            writes[write_location()].append((index, 1, document, None))
+
+    for location, col in locations:
+        if not writes[location]:
+            continue
+        try:
+            await _bulk_save(location, writes[location], results)
+        except OperationFailure as e:
+            if location == 'primary' and 'quota' in str(e).lower() and not SHARED_COLLECTION:
+                logger.warning("Primary database over quota, saving batch to secondary")
+                db_sizes['primary'] = max(db_sizes['primary'], PRIMARY_DB_LIMIT)
+                entries = [(index, code, document, None) for index, code, document, old_file_id in writes[location]]
+                try:
+                    await _bulk_save('secondary', entries, results)
+                except Exception as e:
+                    logger.error(f"Secondary database error: {e}")
+            else:
+                logger.error(f"{location.title()} database bulk write error: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error in {location} bulk write: {e}")
+
+    if any(saved for saved, code in results):
+        invalidate_search_cache(*refreshed)
+    return results
+
+
+async def _bulk_save(location, entries, results):
+    """Write (index, code, document, old_file_id) entries and record each
+    entry's outcome in results. Id refreshes are swapped in one transaction,
+    new files go in with one unordered bulk write."""
+    col = COLLECTIONS[location]
+    refreshes = [entry for entry in entries if entry[3]]
+    inserts = [entry for entry in entries if not entry[3]]
+
+    if refreshes:
+        try:
+            await replace_file_ids(location, [(old_file_id, document) for _, _, document, old_file_id in refreshes])
+            for index, code, document, _ in refreshes:
+                results[index] = (True, code)
+                record_write(location, document)
+        except BulkWriteError:
+            # The transaction was rolled back as a whole; swap one at a time so
+            # only the files that really clash are left out
+            for index, code, document, old_file_id in refreshes:
+                try:
+                    await replace_file_id(location, old_file_id, document)
+                except BulkWriteError as e:
+                    errors = e.details.get('writeErrors', [])
+                    results[index] = (False, 0 if all(error.get('code') == 11000 for error in errors) else 2)
+                    continue
+                results[index] = (True, code)
+                record_write(location, document)
+
+    if not inserts:
+        return
+    failed = {}
+    try:
+        await col.bulk_write([InsertOne(document) for _, _, document, _ in inserts], ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get('writeErrors', []):
+            failed[error['index']] = 0 if error.get('code') == 11000 else 2
+    for position, (index, code, document, _) in enumerate(inserts):
+        if position in failed:
+            results[index] = (False, failed[position])
+        else:
+            results[index] = (True, code)
+            record_write(location, document)
+
+
 async def save_to_secondary(document, file_name):
     """Helper function to save to secondary database"""
     try:
-        if primary_col.find_one({'_id': document['_id']}):
+        if await primary_col.find_one({'_id': document['_id']}):
             logger.warning(f'{file_name} already exists in primary database')
             return False, 0
-        secondary_col.insert_one(document)
+        await secondary_col.insert_one(document)
+        record_write('secondary', document)
+        invalidate_search_cache()
         logger.info(f'{file_name} saved to secondary database')
         return True, 1
     except DuplicateKeyError:
@@ -171,35 +535,32 @@ async def save_to_secondary(document, file_name):
         logger.error(f"Secondary database error: {e}")
         return False, 2
 
+def build_search_filter(query, file_type=None, extra=None):
+    """Build the token filter for a query, None if it has no searchable terms"""
+    # Every query token must be present in the document's token list;
+    # $all over the multikey index intersects the postings of each term
+    terms = get_name_tokens(query.strip())
+    if not terms:
+        return None
+
+    filter = {'tokens': {'$all': terms}}
+    if file_type:
+        filter['file_type'] = file_type
+    if extra:
+        filter.update(extra)
+    return filter
+
 async def get_search_results(query, file_type=None):
     """Search in both databases and return combined results"""
-    query = query.strip()
-    if not query:
-        return []
-
-    # Split query into individual terms
-    terms = query.split()
-
-    # Create a list of regex patterns for each term
-    regex_patterns = []
-    for term in terms:
-        raw_pattern = r'(\b|[\.\+\-_])' + re.escape(term) + r'(\b|[\.\+\-_])'
-        try:
-            regex_patterns.append(re.compile(raw_pattern, flags=re.IGNORECASE))
-        except:
-            continue
-
-    if not regex_patterns:
+    filter = build_search_filter(query, file_type)
+    if filter is None:
         return []
 
-    # Create filter that requires all terms to match
-    filter = {'file_name': {'$all': regex_patterns}}
-
-    # Get results from primary database if available
-    primary_results = list(primary_col.find(filter))
-
-    # Get results from secondary database if available
-    secondary_results = list(secondary_col.find(filter))
+    # Query both databases concurrently
+    primary_results, secondary_results = await asyncio.gather(
+        primary_col.find(filter).to_list(length=None),
+        secondary_col.find(filter).to_list(length=None)
+    )
 
     # Combine results (remove duplicates by file_id)
     combined_results = primary_results
@@ -213,6 +574,71 @@ async def get_search_results(query, file_type=None):
 
     return combined_results
 
+async def get_search_ids(query, file_type=None):
+    """Return the ordered ids of every match"""
+    return [doc['_id'] for doc in await get_search_facets(query, file_type)]
+
+async def get_search_facets(query, file_type=None):
+    """Return every match as an ordered list of _id plus its facet fields
+
+    Results are served from search_cache when the same tokens were searched
+    since the last catalog write. Callers must not modify the returned list.
+    """
+    filter = build_search_filter(query, file_type)
+    if filter is None:
+        return []
+
+    key = (tuple(sorted(filter['tokens']['$all'])), file_type)
+    cached = search_cache.get(key)
+    if cached is not None:
+        return cached
+    return await search_flight.do(key, _load_search_facets, filter, key)
+
+async def _load_search_facets(filter, key):
+    version = catalog_version
+    # indexed_at has no index of its own: the token index finds the matches
+    # and they are ordered in memory, which a sort index would only tempt the
+    # planner away from
+    results = await asyncio.gather(*(
+        col.find(filter, FACET_PROJECTION).sort('indexed_at', -1).to_list(length=None)
+        for col in search_cols
+    ))
+    if not SHARED_COLLECTION:
+        for location, docs in zip(search_locations, results):
+            for doc in docs:
+                file_locations.set(doc['_id'], location)
+    matches = [doc for docs in results for doc in docs]
+    if version == catalog_version:
+        search_cache.set(key, matches)
+    return matches
+
+async def get_files_by_ids(ids):
+    """Fetch projected result documents for ids, preserving their order"""
+    if not ids:
+        return []
+    found = {}
+    for file_id in ids:
+        doc = files_cache.get(file_id)
+        if doc is not None:
+            found[file_id] = doc
+    # Ids with a known database are only looked up there
+    lookups = {}
+    for file_id in ids:
+        if file_id not in found:
+            location = file_location(file_id)
+            for location in ([location] if location else search_locations):
+                lookups.setdefault(location, []).append(file_id)
+    if lookups:
+        results = await asyncio.gather(*(
+            COLLECTIONS[location].find({'_id': {'$in': missing}}, RESULT_PROJECTION).to_list(length=None)
+            for location, missing in lookups.items()
+        ))
+        for docs in results:
+            for doc in docs:
+                found[doc['_id']] = doc
+                files_cache.set(doc['_id'], doc)
+    return [found[file_id] for file_id in ids if file_id in found]
+
 async def get_delete_results(query):
     """Get files to delete from both databases"""
     query = query.strip()
@@ -225,9 +651,10 @@ async def get_delete_results(query):
     filter = {'file_name': regex}
 
     # Get results from both databases
-    primary_files = list(primary_col.find(filter))
-
-    secondary_files = list(secondary_col.find(filter))
+    primary_files, secondary_files = await asyncio.gather(
+        primary_col.find(filter).to_list(length=None),
+        secondary_col.find(filter).to_list(length=None)
+    )
 
     total_count = len(primary_files) + len(secondary_files)
     return primary_files + secondary_files, total_count
@@ -236,23 +663,28 @@ async def delete_func(file):
     """Delete a file from the database(s)"""
     file_id = file.get('_id')
 
-    result = primary_col.delete_one({'_id': file_id})
-
-    result = secondary_col.delete_one({'_id': file_id})
+    location = file_location(file_id)
+    cols = [COLLECTIONS[location]] if location else [primary_col, secondary_col]
+    await asyncio.gather(*(col.delete_one({'_id': file_id}) for col in cols))
+    invalidate_search_cache(file_id)
 
 
 async def get_file_details(query):
     """Get file details from both databases"""
-    # Check primary first
-    file = primary_col.find_one({'_id': query})
-    if file:
-        return file
-
-    file = secondary_col.find_one({'_id': query})
-    if file:
-        return file
-
-    return None
+    location = file_location(query)
+    if location:
+        file = await COLLECTIONS[location].find_one({'_id': query})
+        if file or SHARED_COLLECTION:
+            return file
+
+    # Unknown (or moved) id: look up both databases at once, primary wins
+    primary_file, secondary_file = await asyncio.gather(
+        primary_col.find_one({'_id': query}),
+        secondary_col.find_one({'_id': query})
+    )
+    if primary_file or secondary_file:
+        file_locations.set(query, 'primary' if primary_file else 'secondary')
+    return primary_file or secondary_file
 
 def encode_file_id(s: bytes) -> str:
     r, n = b"", 0
@@ -292,19 +724,20 @@ async def update_file_id(old_file_id, new_file_id, file_name):
     """Update an existing file's ID in the database"""
     try:
         # Update in primary database
-        result = primary_col.update_one(
+        result = await primary_col.update_one(
             {'_id': old_file_id},
             {'$set': {'_id': new_file_id}}
         )
         
         if result.matched_count == 0:
             # Try secondary database
-            result = secondary_col.update_one(
+            result = await secondary_col.update_one(
                 {'_id': old_file_id},
                 {'$set': {'_id': new_file_id}}
             )
         
         if result.matched_count > 0:
+            invalidate_search_cache(old_file_id)
             logger.info(f"Updated file ID for {file_name}")
             return True
         else:
@@ -318,24 +751,19 @@ async def update_file_id(old_file_id, new_file_id, file_name):
 async def find_duplicate_by_name_and_size(file_name, file_size):
     """Find existing file by name and size to handle duplicates"""
     try:
-        # Search in primary database first
-        existing = primary_col.find_one({
-            'file_name': file_name,
-            'file_size': file_size
-        })
-        
-        if existing:
-            return existing, 'primary'
-            
-        # Search in secondary database
-        existing = secondary_col.find_one({
-            'file_name': file_name,
-            'file_size': file_size
-        })
-        
-        if existing:
-            return existing, 'secondary'
-            
+        # Search both databases concurrently, primary wins
+        filter = {'file_name': file_name, 'file_size': file_size}
+        primary_existing, secondary_existing = await asyncio.gather(
+            primary_col.find_one(filter),
+            secondary_col.find_one(filter)
+        )
+
+        if primary_existing:
+            return primary_existing, 'primary'
+
+        if secondary_existing:
+            return secondary_existing, 'secondary'
+
         return None, None
         
     except Exception as e:
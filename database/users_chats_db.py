@@ -1,15 +1,30 @@
-from pymongo import MongoClient
-from info import DATABASE_NAME, DATABASE_URL, IMDB, IMDB_TEMPLATE, MELCOW_NEW_USERS, P_TTI_SHOW_OFF, SINGLE_BUTTON, SPELL_CHECK_REPLY, PROTECT_CONTENT
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from cache import LRUCache
+from info import DATABASE_NAME, DATABASE_URL, IMDB, IMDB_TEMPLATE, MELCOW_NEW_USERS, P_TTI_SHOW_OFF, SINGLE_BUTTON, SPELL_CHECK_REPLY, PROTECT_CONTENT, USER_CACHE_SIZE, CHAT_CACHE_SIZE
+
+_UNKNOWN = object()
 
 class Database:
-    
+
     def __init__(self, uri, database_name):
-        self._client = MongoClient(uri)
+        self._client = AsyncIOMotorClient(uri)
         self.db = self._client[database_name]
         self.col = self.db.users
         self.grp = self.db.groups
         self.req = self.db.requests
         self.sttg = self.db.settings
+        self.jobs = self.db.index_jobs
+        self.marks = self.db.channel_marks
+        self.members = self.db.channel_members
+        # Presence caches: users map id -> language preference, chats id -> True.
+        # Only known ids are cached, so a miss always falls through to Mongo.
+        self.users_cache = LRUCache('users', USER_CACHE_SIZE)
+        self.chats_cache = LRUCache('chats', CHAT_CACHE_SIZE)
+        # Users with a join request, loaded once at start and written through,
+        # so the subscription gate never has to query Mongo for them
+        self.join_reqs = set()
 
     def new_user(self, id, name):
         return dict(
@@ -26,67 +41,172 @@ class Database:
 
     async def add_user(self, id, name):
         user = self.new_user(id, name)
-        self.col.insert_one(user)
+        await self.col.insert_one(user)
+        self.users_cache.set(int(id), None)
+
+    async def load_join_reqs(self):
+        """Fill the join request set and make sure each id is stored once"""
+        self.join_reqs = {req['id'] async for req in self.req.find({}, {'id': 1})}
+        try:
+            await self.req.create_index('id', unique=True)
+        except DuplicateKeyError:
+            # Requests saved before the index existed may repeat; keep one each
+            await self.req.delete_many({})
+            if self.join_reqs:
+                await self.req.insert_many([{'id': id} for id in self.join_reqs])
+            await self.req.create_index('id', unique=True)
+        return len(self.join_reqs)
 
     async def find_join_req(self, id):
-        return bool(self.req.find_one({'id': id}))
+        return id in self.join_reqs
 
     async def add_join_req(self, id):
-        self.req.insert_one({'id': id})
+        await self.req.update_one({'id': id}, {'$setOnInsert': {'id': id}}, upsert=True)
+        self.join_reqs.add(id)
 
     async def del_join_req(self):
-        self.req.drop()
+        await self.req.drop()
+        self.join_reqs.clear()
+        await self.req.create_index('id', unique=True)
+
+    async def _load_user(self, id):
+        """Fetch a user into the presence cache, return the document or None"""
+        user = await self.col.find_one({'id': int(id)}, {'language': 1})
+        if user:
+            self.users_cache.set(int(id), user.get('language'))
+        return user
 
     async def is_user_exist(self, id):
-        user = self.col.find_one({'id': int(id)})
-        return bool(user)
+        if int(id) in self.users_cache:
+            return True
+        return bool(await self._load_user(id))
 
     async def total_users_count(self):
-        return self.col.count_documents({})
+        return await self.col.count_documents({})
 
 
     async def get_all_users(self):
         return self.col.find({})
 
     async def delete_user(self, user_id):
-        self.col.delete_many({'id': int(user_id)})
+        await self.col.delete_many({'id': int(user_id)})
+        self.users_cache.pop(int(user_id))
 
     async def add_chat(self, chat, title):
         chat_data = self.new_group(chat, title)
-        self.grp.insert_one(chat_data)
+        await self.grp.insert_one(chat_data)
+        self.chats_cache.set(int(chat), True)
 
     async def get_chat(self, chat):
-        chat = self.grp.find_one({'id': int(chat)})
-        return bool(chat)
-    
+        if int(chat) in self.chats_cache:
+            return True
+        found = await self.grp.find_one({'id': int(chat)}, {'_id': 1})
+        if found:
+            self.chats_cache.set(int(chat), True)
+        return bool(found)
+
     async def get_sttg(self):
-        return self.sttg.find_one({'_id': 'sttg'})
+        return await self.sttg.find_one({'_id': 'sttg'})
 
     async def update_sttg(self, sttg):
-        if not self.sttg.find_one({'_id': 'sttg'}):
-            self.sttg.insert_one({'_id': 'sttg'})
-        self.sttg.update_one({'_id': 'sttg'}, {'$set': sttg})
+        await self.sttg.update_one({'_id': 'sttg'}, {'$set': sttg}, upsert=True)
 
     async def total_chat_count(self):
-        return self.grp.count_documents({})
+        return await self.grp.count_documents({})
 
     async def get_all_chats(self):
         return self.grp.find({})
 
     async def get_db_size(self):
-        return self.db.command("dbstats")['dataSize']
-    
+        return (await self.db.command("dbstats"))['dataSize']
+
+    async def save_index_job(self, chat, last_msg_id, cursor, msg_chat):
+        """Start (or restart) the indexing job of a chat"""
+        job = dict(
+            _id=chat,
+            chat=chat,
+            last_msg_id=last_msg_id,
+            cursor=cursor,
+            msg_chat=msg_chat,
+            counters={},
+            status='running'
+        )
+        await self.jobs.replace_one({'_id': chat}, job, upsert=True)
+        return job
+
+    async def update_index_job(self, chat, status=None, **fields):
+        """Checkpoint a job; with status given, only a running job is moved to it"""
+        query = {'_id': chat}
+        if status:
+            query['status'] = 'running'
+            fields['status'] = status
+        await self.jobs.update_one(query, {'$set': fields})
+
+    async def set_index_job_status(self, chat, status):
+        result = await self.jobs.update_one({'_id': chat}, {'$set': {'status': status}})
+        return bool(result.matched_count)
+
+    async def get_index_job(self, chat):
+        return await self.jobs.find_one({'_id': chat})
+
+    async def get_index_jobs(self, *statuses):
+        query = {'status': {'$in': list(statuses)}} if statuses else {}
+        return await self.jobs.find(query).to_list(length=None)
+
+    async def get_channel_marks(self):
+        """Last seen message id of every channel, keyed by chat id"""
+        return {mark['_id']: mark['last_msg_id'] async for mark in self.marks.find({})}
+
+    async def update_channel_marks(self, marks):
+        """Raise the stored marks to the given message ids, never lower them"""
+        if marks:
+            await self.marks.bulk_write([
+                UpdateOne({'_id': chat}, {'$max': {'last_msg_id': msg_id}}, upsert=True)
+                for chat, msg_id in marks.items()
+            ], ordered=False)
+
+    async def update_member(self, chat, user_id, is_member):
+        await self.members.update_one(
+            {'_id': f'{chat}:{user_id}'},
+            {'$set': {'chat': chat, 'user': user_id, 'member': is_member}},
+            upsert=True
+        )
+
+    async def del_members(self, chat, user_ids):
+        if user_ids:
+            await self.members.delete_many({'_id': {'$in': [f'{chat}:{user_id}' for user_id in user_ids]}})
+
+    async def update_members(self, chat, user_ids):
+        """Record many members of a chat at once"""
+        if user_ids:
+            await self.members.bulk_write([
+                UpdateOne(
+                    {'_id': f'{chat}:{user_id}'},
+                    {'$set': {'chat': chat, 'user': user_id, 'member': True}},
+                    upsert=True
+                )
+                for user_id in user_ids
+            ], ordered=False)
+
+    def get_members(self):
+        """Cursor over every stored (chat, user, member) record"""
+        return self.members.find({}, {'_id': 0})
+
     async def add_user_language(self, user_id, language):
         """Add or update user's language preference"""
-        self.col.update_one(
+        await self.col.update_one(
             {'id': int(user_id)},
             {'$set': {'language': language}},
             upsert=True
         )
-    
+        self.users_cache.set(int(user_id), language)
+
     async def get_user_language(self, user_id):
         """Get user's language preference"""
-        user = self.col.find_one({'id': int(user_id)})
+        language = self.users_cache.get(int(user_id), _UNKNOWN)
+        if language is not _UNKNOWN:
+            return language
+        user = await self._load_user(user_id)
         return user.get('language') if user else None
 
 
@@ -59,6 +59,38 @@ FILE_DB_URL = environ.get("FILE_DB_URL", DATABASE_URL)
 FILE_DB_NAME = environ.get("FILE_DB_NAME", DATABASE_NAME)
 COLLECTION_NAME = environ.get('COLLECTION_NAME', 'Telegram_files')
 
+# In-process caches
+USER_CACHE_SIZE = int(environ.get('USER_CACHE_SIZE', "50000"))
+CHAT_CACHE_SIZE = int(environ.get('CHAT_CACHE_SIZE', "10000"))
+SEARCH_SESSION_MEMORY = int(environ.get('SEARCH_SESSION_MEMORY', str(64 * 1024 * 1024)))
+SEARCH_SESSION_TTL = int(environ.get('SEARCH_SESSION_TTL', "600"))
+SEARCH_CACHE_SIZE = int(environ.get('SEARCH_CACHE_SIZE', "500"))
+SEARCH_CACHE_TTL = int(environ.get('SEARCH_CACHE_TTL', "900"))
+FILE_CACHE_SIZE = int(environ.get('FILE_CACHE_SIZE', "20000"))
+INLINE_CURSOR_CACHE_SIZE = int(environ.get('INLINE_CURSOR_CACHE_SIZE', "5000"))
+INLINE_CURSOR_TTL = int(environ.get('INLINE_CURSOR_TTL', "300"))
+INGEST_SEEN_SIZE = int(environ.get('INGEST_SEEN_SIZE', "100000"))
+FILE_LOCATION_CACHE_SIZE = int(environ.get('FILE_LOCATION_CACHE_SIZE', "200000"))
+MEMBERSHIP_CACHE_SIZE = int(environ.get('MEMBERSHIP_CACHE_SIZE', "100000"))
+MEMBER_CACHE_TTL = int(environ.get('MEMBER_CACHE_TTL', "3600"))
+NON_MEMBER_CACHE_TTL = int(environ.get('NON_MEMBER_CACHE_TTL', "60"))
+
+# New files go to the secondary database once the primary's dataSize reaches PRIMARY_DB_LIMIT bytes
+PRIMARY_DB_LIMIT = int(environ.get('PRIMARY_DB_LIMIT', str(480 * 1024 * 1024)))
+DB_SIZE_REFRESH = int(environ.get('DB_SIZE_REFRESH', "600"))
+
+# Telegram request budget: calls per second overall, messages per second into one chat,
+# and the share of the overall budget background jobs leave to users
+TG_RATE = float(environ.get('TG_RATE', "25"))
+TG_CHAT_RATE = float(environ.get('TG_CHAT_RATE', "1"))
+TG_BACKGROUND_RESERVE = float(environ.get('TG_BACKGROUND_RESERVE', "0.3"))
+
+# Indexing
+INDEX_CONCURRENCY = int(environ.get('INDEX_CONCURRENCY', "3"))
+# Live channel uploads are written in bulk every INGEST_BATCH_SIZE files or INGEST_FLUSH_MS
+INGEST_BATCH_SIZE = int(environ.get('INGEST_BATCH_SIZE', "100"))
+INGEST_FLUSH_MS = int(environ.get('INGEST_FLUSH_MS', "500"))
+
 # Filters Configuration 
 MAX_RIST_BTNS = int(environ.get('MAX_RIST_BTNS', "10"))
 START_MESSAGE = environ.get('START_MESSAGE', script.START_TXT)
@@ -389,7 +389,7 @@ async def test_database_command(client: Client, message: Message):
         from database.ia_filterdb import primary_col, secondary_col, get_database_count
         
         try:
-            primary_count, secondary_count = get_database_count()
+            primary_count, secondary_count = await get_database_count()
             total_movies = primary_count + secondary_count
             
             test_result = f"✅ **Database Test Results**\n\n"
@@ -399,7 +399,7 @@ async def test_database_command(client: Client, message: Message):
             
             if total_movies > 0:
                 # Get sample movie
-                sample = primary_col.find_one()
+                sample = await primary_col.find_one()
                 if sample:
                     test_result += f"📁 **Sample Movie:**\n"
                     test_result += f"   • Name: {sample.get('file_name', 'Unknown')}\n"
@@ -1,63 +1,10 @@
 import logging
 import asyncio
-from hydrogram import Client, filters, enums
-from hydrogram.errors import FloodWait
+from hydrogram import Client, filters
 from info import ADMINS, CHANNELS
-from database.ia_filterdb import save_file
-from utils import temp
-import time
 
 logger = logging.getLogger(__name__)
 
-# Store last indexing time for each channel
-last_indexed = {}
-
-@Client.on_message(filters.chat(CHANNELS) & filters.media)
-async def auto_index_new_files(client, message):
-    """Automatically index new files when they're posted to movie channels"""
-    try:
-        # Check if message has media
-        if not message.media:
-            return
-            
-        # Check if it's a supported media type
-        if message.media not in [enums.MessageMediaType.VIDEO, enums.MessageMediaType.AUDIO, enums.MessageMediaType.DOCUMENT]:
-            return
-            
-        # Get media object
-        media = getattr(message, message.media.value, None)
-        if not media:
-            return
-            
-        # Set media properties
-        media.file_type = message.media.value
-        media.caption = message.caption
-        
-        # Save to database
-        saved, status = await save_file(media)
-        
-        if saved:
-            logger.info(f"Auto-indexed new file: {media.file_name}")
-            # Optionally notify admins
-            if ADMINS:
-                try:
-                    await client.send_message(
-                        ADMINS[0], 
-                        f"🎬 New movie auto-indexed!\n\n"
-                        f"📁 File: {media.file_name}\n"
-                        f"💾 Size: {media.file_size}\n"
-                        f"📺 Channel: {message.chat.title}"
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to notify admin: {e}")
-        elif status == 0:
-            logger.info(f"File already exists: {media.file_name}")
-        else:
-            logger.error(f"Failed to save file: {media.file_name}")
-            
-    except Exception as e:
-        logger.error(f"Auto-indexing error: {e}")
-
 @Client.on_message(filters.command("auto_index") & filters.user(ADMINS))
 async def manual_auto_index(client, message):
     """Guide user through manual indexing process"""
@@ -105,7 +52,7 @@ async def show_index_status(client, message):
     try:
         # Get database count
         from database.ia_filterdb import get_database_count
-        primary_count, secondary_count = get_database_count()
+        primary_count, secondary_count = await get_database_count()
         total_movies = primary_count + secondary_count
         
         status_msg = f"📊 **Bot Status**\n\n"
@@ -1,91 +1,232 @@
 from hydrogram import Client, filters
-from info import CHANNELS
-from database.ia_filterdb import save_file
+from info import CHANNELS, ADMINS, INGEST_SEEN_SIZE, INGEST_BATCH_SIZE, INGEST_FLUSH_MS
+from database.ia_filterdb import save_files
+from database.users_chats_db import db
+from cache import LRUCache
+from ratelimit import PRIORITY, BACKGROUND
+import asyncio
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
 media_filter = filters.document | filters.video | filters.audio
 
+# Every channel upload goes through one queue and one worker, so a post is
+# written once however often it is delivered. Recently queued file_unique_ids
+# are skipped in memory; the unique index on file_unique_id catches the rest.
+# The worker writes whatever arrived within INGEST_FLUSH_MS in one bulk write
+# and hands each handler its own result.
+INGEST_QUEUE = asyncio.Queue()
+# file_unique_id -> future of the queued save
+QUEUED = LRUCache('ingest_seen', INGEST_SEEN_SIZE)
+# Ids of posts whose save failed, per channel. Marks are kept below the lowest
+# one, so the catch-up after a restart retries it; storing the post clears it.
+UNSAVED = {}
+ingest_task = None
+# Catch-up after a restart scans forward from each channel's stored mark in
+# steps of CATCHUP_STEP ids and stops at the first step with no messages
+CATCHUP_STEP = 1000
+
 
 @Client.on_message(filters.chat(CHANNELS) & media_filter)
 async def media(bot, message):
     """Enhanced Media Handler - Automatically index movies from channels"""
     try:
         logger.info(f"New media detected in channel {message.chat.id} ({message.chat.title})")
-        
-        # Find the media object
-        media = None
-        file_type = None
-        
-        for media_type in ("document", "video", "audio"):
-            media_obj = getattr(message, media_type, None)
-            if media_obj is not None:
-                media = media_obj
-                file_type = media_type
-                break
-        
+        media = prepare_media(message)
         if not media:
-            logger.warning("No media found in message")
             return
+        future = await queue_media(message, media)
+        if future is None:
+            return
+        success, status = await future
+                
+    except Exception as e:
+        logger.error(f"Error in media handler: {e}")
+        import traceback
+        logger.error(f"Full traceback: {traceback.format_exc()}")
+        return
+
+    if success:
+        logger.info(f"✅ Successfully saved {media.file_name} to database")
+        # Optionally notify admins
+        if ADMINS:
+            try:
+                await bot.send_message(
+                    ADMINS[0],
+                    f"🎬 New movie auto-indexed!\n\n"
+                    f"📁 File: {media.file_name}\n"
+                    f"💾 Size: {media.file_size}\n"
+                    f"📺 Channel: {message.chat.title}"
+                )
+            except Exception as e:
+                logger.error(f"Failed to notify admin: {e}")
+    elif status == 0:
+        logger.info(f"⚠️ {media.file_name} already exists in database")
+    else:
+        # Let a repost of the file try again
+        QUEUED.pop(media.file_unique_id)
+        logger.error(f"❌ Failed to save {media.file_name} to database")
+
+
+def prepare_media(message):
+    """Return the message's media ready for saving, None if it has none"""
+    # Find the media object
+    media = None
+    file_type = None
+    
+    for media_type in ("document", "video", "audio"):
+        media_obj = getattr(message, media_type, None)
+        if media_obj is not None:
+            media = media_obj
+            file_type = media_type
+            break
+    
+    if not media:
+        logger.warning("No media found in message")
+        return None
 
-        # Enhanced file name handling
-        if not hasattr(media, 'file_name') or not media.file_name:
-            # Generate filename from caption or use default
-            if message.caption:
-                # Extract potential filename from caption
-                import re
-                filename_match = re.search(r'([^\n]+\.(?:mkv|mp4|avi|mov|wmv|flv|webm|m4v))', message.caption, re.IGNORECASE)
-                if filename_match:
-                    media.file_name = filename_match.group(1).strip()
-                else:
-                    # Use first line of caption as filename
-                    first_line = message.caption.split('\n')[0].strip()
-                    media.file_name = f"{first_line}.mp4" if first_line else f"Movie_{media.file_unique_id}.mp4"
+    # Enhanced file name handling
+    if not hasattr(media, 'file_name') or not media.file_name:
+        # Generate filename from caption or use default
+        if message.caption:
+            # Extract potential filename from caption
+            filename_match = re.search(r'([^\n]+\.(?:mkv|mp4|avi|mov|wmv|flv|webm|m4v))', message.caption, re.IGNORECASE)
+            if filename_match:
+                media.file_name = filename_match.group(1).strip()
             else:
-                media.file_name = f"Movie_{media.file_unique_id}.mp4"
+                # Use first line of caption as filename
+                first_line = message.caption.split('\n')[0].strip()
+                media.file_name = f"{first_line}.mp4" if first_line else f"Movie_{media.file_unique_id}.mp4"
+        else:
+            media.file_name = f"Movie_{media.file_unique_id}.mp4"
+
+    # Set media properties for saving
+    media.file_type = file_type
+    media.caption = message.caption or ""
+    return media
+
+
+async def queue_media(message, media):
+    """Queue media for the ingest worker; returns a future with its
+    (saved, code) result, or None when the file is already queued"""
+    global ingest_task
+    if media.file_unique_id in QUEUED:
+        logger.info(f"Duplicate detected: {media.file_unique_id} is already queued")
+        return None
+    future = asyncio.get_running_loop().create_future()
+    QUEUED.set(media.file_unique_id, future)
+    logger.info(f"Queueing {media.file_type}: {media.file_name} ({media.file_size} bytes)")
+
+    if ingest_task is None or ingest_task.done():
+        ingest_task = asyncio.create_task(ingest_worker())
+    await INGEST_QUEUE.put((message, media, future))
+    return future
 
-        logger.info(f"Processing {file_type}: {media.file_name} ({media.file_size} bytes)")
 
-        # Check for duplicates before saving
-        from database.ia_filterdb import primary_col, secondary_col
-        
-        existing_file = None
+async def ingest_worker():
+    """Collect queued uploads until the batch is full or the flush interval
+    passes, then save them with one bulk write"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await INGEST_QUEUE.get()]
+        deadline = loop.time() + INGEST_FLUSH_MS / 1000
+        while len(batch) < INGEST_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(INGEST_QUEUE.get(), timeout))
+            except asyncio.TimeoutError:
+                break
         try:
-            # Check by unique_id first
-            existing_file = primary_col.find_one({'_id': media.file_unique_id})
-            if not existing_file:
-                existing_file = secondary_col.find_one({'_id': media.file_unique_id})
-            
-            # Also check by file_name as secondary check
-            if not existing_file:
-                existing_file = primary_col.find_one({'file_name': media.file_name})
-                if not existing_file:
-                    existing_file = secondary_col.find_one({'file_name': media.file_name})
-                    
+            results = await save_files([media for _, media, _ in batch])
         except Exception as e:
-            logger.error(f"Error checking for duplicates: {e}")
-        
-        if existing_file:
-            logger.info(f"Duplicate detected: {media.file_name} already exists in database")
-            return
-
-        # Set media properties for saving
-        media.file_type = file_type
-        media.caption = message.caption or ""
-        
-        # Save to database
-        success, status = await save_file(media)
-        
-        if success:
-            logger.info(f"✅ Successfully saved {media.file_name} to database")
-        else:
-            if status == 0:
-                logger.info(f"⚠️ {media.file_name} already exists in database")
+            logger.exception(e)
+            results = [(False, 2)] * len(batch)
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        # Stored posts (saved now or already there) move their channel's
+        # high-water mark for catch-up, but never past a post that failed
+        marks = {}
+        for (message, _, _), (success, status) in zip(batch, results):
+            chat = message.chat.id
+            if success or status == 0:
+                UNSAVED.get(chat, set()).discard(message.id)
+                marks[chat] = max(marks.get(chat, 0), message.id)
             else:
-                logger.error(f"❌ Failed to save {media.file_name} to database")
-                
-    except Exception as e:
-        logger.error(f"Error in media handler: {e}")
-        import traceback
-        logger.error(f"Full traceback: {traceback.format_exc()}")
\ No newline at end of file
+                UNSAVED.setdefault(chat, set()).add(message.id)
+        marks = {chat: capped_mark(chat, mark) for chat, mark in marks.items()}
+        try:
+            await db.update_channel_marks(marks)
+        except Exception as e:
+            logger.error(f"Error saving channel marks: {e}")
+        for _ in batch:
+            INGEST_QUEUE.task_done()
+
+
+def capped_mark(chat, mark):
+    """mark, lowered to just below the channel's first unsaved post"""
+    unsaved = UNSAVED.get(chat)
+    if unsaved:
+        return min(mark, min(unsaved) - 1)
+    return mark
+
+
+async def drain_ingest(timeout=30):
+    """Write out every queued upload, then stop the worker"""
+    try:
+        await asyncio.wait_for(INGEST_QUEUE.join(), timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"{INGEST_QUEUE.qsize()} queued uploads were not saved before shutdown")
+    if ingest_task is not None:
+        ingest_task.cancel()
+
+
+async def catch_up_channels(bot):
+    """Index what was posted to CHANNELS while the bot was offline"""
+    PRIORITY.set(BACKGROUND)
+    marks = await db.get_channel_marks()
+    for chat in CHANNELS:
+        if chat not in marks:
+            logger.info(f"No high-water mark for {chat} yet, nothing to catch up")
+            continue
+        try:
+            await catch_up_channel(bot, chat, marks[chat])
+        except Exception as e:
+            logger.error(f"Catch-up of {chat} failed: {e}")
+
+
+async def catch_up_channel(bot, chat, mark):
+    """Scan the ids after mark through the batched history reader and queue
+    every media post found"""
+    start = mark + 1
+    saved = 0
+    while True:
+        end = start + CATCHUP_STEP - 1
+        latest = None
+        futures = []
+        async for message in bot.iter_messages(chat, end, start):
+            if message.empty:
+                continue
+            latest = message.id
+            media = prepare_media(message) if message.media else None
+            if media:
+                # A post already queued by the live handler is waited for too
+                future = await queue_media(message, media) or QUEUED.get(media.file_unique_id)
+                if future:
+                    futures.append(future)
+        if latest is None:
+            break
+        # The step's files are written before the mark moves past them
+        results = await asyncio.gather(*futures)
+        saved += sum(1 for success, _ in results if success)
+        if any(not success and status != 0 for success, status in results):
+            logger.warning(f"Some posts of {chat} before {end + 1} were not saved, catch-up stops there")
+            break
+        # Non-media posts still move the mark past what was scanned
+        await db.update_channel_marks({chat: capped_mark(chat, latest)})
+        start = end + 1
+    logger.info(f"Caught up {chat} from message {mark}: {saved} new files")
@@ -9,7 +9,7 @@ from hydrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Callback
 from hydrogram.errors import FloodWait, UserIsBlocked, PeerIdInvalid
 from database.users_chats_db import db
 from language_config import COMMON_CHANNEL, get_language_channels, get_language_channel, get_all_languages, get_language_display_name, LANGUAGE_CHANNELS
-from utils import is_subscribed, temp
+from utils import is_subscribed, temp, forget_non_membership
 from info import ADMINS
 
 logger = logging.getLogger(__name__)
@@ -53,6 +53,10 @@ async def check_user_subscriptions(client: Client, user_id: int, selected_langua
     logger.info(f"Final result for user {user_id}: subscribed={len(missing_channels) == 0}, missing={missing_channels}")
     return len(missing_channels) == 0, missing_channels, selected_language is None
 
+def required_channel_ids():
+    from language_config import get_required_channels
+    return [int(channel_id) for channel_id in get_required_channels()]
+
 async def create_subscription_buttons(client: Client, user_id: int, selected_language: str = None, callback_data: str = None) -> InlineKeyboardMarkup:
     """Create buttons for channel subscription with auto-join capability"""
     from language_config import get_required_channels, get_channel_info
@@ -198,6 +202,7 @@ async def handle_subscription_check(client: Client, query: CallbackQuery):
         await asyncio.sleep(2)
         
         # Check if user is subscribed to required channels
+        forget_non_membership(user_id, required_channel_ids())
         is_subscribed, missing_channels, _ = await check_user_subscriptions(client, user_id, language)
         
         if is_subscribed:
@@ -468,6 +473,7 @@ async def handle_file_access_check(client: Client, query: CallbackQuery):
             return
         
         # Check if user is subscribed to required channels
+        forget_non_membership(user_id, required_channel_ids())
         is_subscribed, missing_channels, _ = await check_user_subscriptions(client, user_id, user_language)
         
         if is_subscribed:
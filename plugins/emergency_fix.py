@@ -5,7 +5,7 @@ import logging
 from hydrogram import Client, filters
 from hydrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from info import ADMINS
-from database.ia_filterdb import primary_col, secondary_col
+from database.ia_filterdb import primary_col, secondary_col, invalidate_search_cache
 
 logger = logging.getLogger(__name__)
 
@@ -17,10 +17,10 @@ async def emergency_fix_command(client: Client, message: Message):
         
         # Check the specific problematic file
         expired_file_id = "BQADBQADIREAAo3P8VUghYq4pZK_LRYE"
-        file_info = primary_col.find_one({'_id': expired_file_id})
+        file_info = await primary_col.find_one({'_id': expired_file_id})
         
         if not file_info:
-            file_info = secondary_col.find_one({'_id': expired_file_id})
+            file_info = await secondary_col.find_one({'_id': expired_file_id})
         
         if file_info:
             file_name = file_info.get('file_name', 'Unknown')
@@ -68,8 +68,8 @@ Use `/fix_expired_files` to find and fix all expired files
 📊 **Current Database Status:**"""
             
             # Get database stats
-            primary_count = primary_col.count_documents({})
-            secondary_count = secondary_col.count_documents({})
+            primary_count = await primary_col.count_documents({})
+            secondary_count = await secondary_col.count_documents({})
             total_files = primary_count + secondary_count
             
             emergency_report += f"""
@@ -167,7 +167,7 @@ This will:
         search_pattern = {'file_name': {'$regex': movie_name, '$options': 'i'}}
         
         # Check primary database
-        found_files = list(primary_col.find(search_pattern))
+        found_files = await primary_col.find(search_pattern).to_list(length=None)
         removed_count = 0
         
         for file_info in found_files:
@@ -185,12 +185,13 @@ This will:
                 # File works, keep it
             except:
                 # File is expired, remove it
-                primary_col.delete_one({'_id': file_id})
+                await primary_col.delete_one({'_id': file_id})
+                invalidate_search_cache(file_id)
                 removed_count += 1
                 logger.info(f"Removed expired file: {file_name}")
         
         # Check secondary database too
-        secondary_files = list(secondary_col.find(search_pattern))
+        secondary_files = await secondary_col.find(search_pattern).to_list(length=None)
         for file_info in secondary_files:
             file_id = file_info['_id']
             file_name = file_info['file_name']
@@ -203,7 +204,8 @@ This will:
                 )
                 await test_msg.delete()
             except:
-                secondary_col.delete_one({'_id': file_id})
+                await secondary_col.delete_one({'_id': file_id})
+                invalidate_search_cache(file_id)
                 removed_count += 1
                 logger.info(f"Removed expired file from secondary: {file_name}")
         
@@ -263,13 +265,13 @@ async def emergency_db_check_callback(client: Client, query):
         await query.message.edit("🔍 **Emergency Database Check...**")
         
         # Quick database health check
-        primary_count = primary_col.count_documents({})
-        secondary_count = secondary_col.count_documents({})
+        primary_count = await primary_col.count_documents({})
+        secondary_count = await secondary_col.count_documents({})
         
         # Check for the specific problematic file
-        expired_file = primary_col.find_one({'_id': 'BQADBQADIREAAo3P8VUghYq4pZK_LRYE'})
+        expired_file = await primary_col.find_one({'_id': 'BQADBQADIREAAo3P8VUghYq4pZK_LRYE'})
         if not expired_file:
-            expired_file = secondary_col.find_one({'_id': 'BQADBQADIREAAo3P8VUghYq4pZK_LRYE'})
+            expired_file = await secondary_col.find_one({'_id': 'BQADBQADIREAAo3P8VUghYq4pZK_LRYE'})
         
         db_status = f"""🔍 **Emergency Database Status**
 
@@ -6,8 +6,7 @@ import logging
 from hydrogram import Client, filters
 from hydrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from info import ADMINS
-from database.ia_filterdb import primary_col, secondary_col, find_duplicate_by_name_and_size
-import asyncio
+from database.ia_filterdb import primary_col, secondary_col, find_duplicate_by_name_and_size, invalidate_search_cache
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +17,7 @@ async def fix_expired_files_command(client: Client, message: Message):
         status_msg = await message.reply("🔄 **Checking for expired file IDs...**\n\nThis may take a few minutes...")
         
         # Get sample of files to test
-        test_files = list(primary_col.find().limit(20))  # Test first 20 files
+        test_files = await primary_col.find().limit(20).to_list(length=None)  # Test first 20 files
         
         if not test_files:
             await status_msg.edit("📭 **No files found in database**")
@@ -63,9 +62,6 @@ async def fix_expired_files_command(client: Client, message: Message):
                         'size': file_info.get('file_size', 0),
                         'error': str(e)[:50]
                     })
-                
-            # Small delay to avoid rate limiting
-            await asyncio.sleep(0.5)
         
         # Prepare results
         expired_list = []
@@ -143,15 +139,15 @@ This command will:
         await message.reply(f"🔍 **Searching for:** {movie_name}")
         
         # Search for movie in database
-        search_results = list(primary_col.find({
+        search_results = await primary_col.find({
             'file_name': {'$regex': movie_name, '$options': 'i'}
-        }).limit(5))
+        }).limit(5).to_list(length=None)
         
         if not search_results:
             # Try secondary database
-            search_results = list(secondary_col.find({
+            search_results = await secondary_col.find({
                 'file_name': {'$regex': movie_name, '$options': 'i'}
-            }).limit(5))
+            }).limit(5).to_list(length=None)
         
         if not search_results:
             await message.reply(f"❌ **Movie not found:** {movie_name}\n\n"
@@ -210,13 +206,14 @@ async def auto_fix_database_command(client: Client, message: Message):
         
         # Fix 1: Remove files with obviously invalid IDs
         logger.info("Removing files with invalid ID formats...")
-        invalid_files = list(primary_col.find({}))
+        invalid_files = await primary_col.find({}).to_list(length=None)
         removed_invalid = 0
         
         for file_info in invalid_files:
             file_id = str(file_info.get('_id', ''))
             if len(file_id) < 5 or len(file_id) > 300 or not file_id.strip():
-                primary_col.delete_one({'_id': file_info['_id']})
+                await primary_col.delete_one({'_id': file_info['_id']})
+                invalidate_search_cache(file_info['_id'])
                 removed_invalid += 1
         
         if removed_invalid > 0:
@@ -224,7 +221,7 @@ async def auto_fix_database_command(client: Client, message: Message):
         
         # Fix 2: Remove duplicate entries (same name and size)
         logger.info("Checking for duplicate entries...")
-        all_files = list(primary_col.find({}))
+        all_files = await primary_col.find({}).to_list(length=None)
         duplicates_removed = 0
         seen_files = {}
         
@@ -241,11 +238,13 @@ async def auto_fix_database_command(client: Client, message: Message):
                 # Keep the one with longer ID (usually more recent/valid)
                 if len(str(current_id)) > len(str(existing_id)):
                     # Remove the old one
-                    primary_col.delete_one({'_id': existing_id})
+                    await primary_col.delete_one({'_id': existing_id})
+                    invalidate_search_cache(existing_id)
                     seen_files[file_key] = file_info
                 else:
                     # Remove the current one
-                    primary_col.delete_one({'_id': current_id})
+                    await primary_col.delete_one({'_id': current_id})
+                    invalidate_search_cache(current_id)
                 
                 duplicates_removed += 1
             else:
@@ -255,8 +254,8 @@ async def auto_fix_database_command(client: Client, message: Message):
             fixes_applied.append(f"✅ Removed {duplicates_removed} duplicate entries")
         
         # Fix 3: Update database statistics
-        primary_count = primary_col.count_documents({})
-        secondary_count = secondary_col.count_documents({})
+        primary_count = await primary_col.count_documents({})
+        secondary_count = await secondary_col.count_documents({})
         
         fixes_applied.append(f"📊 Database now has {primary_count + secondary_count:,} total files")
         
@@ -301,12 +300,12 @@ async def admin_db_stats_callback(client: Client, query):
             return
         
         # Get database stats
-        primary_count = primary_col.count_documents({})
-        secondary_count = secondary_col.count_documents({})
+        primary_count = await primary_col.count_documents({})
+        secondary_count = await secondary_col.count_documents({})
         total_files = primary_count + secondary_count
         
         # Get recent files
-        recent_files = list(primary_col.find().sort([("_id", -1)]).limit(3))
+        recent_files = await primary_col.find().sort([("_id", -1)]).limit(3).to_list(length=None)
         recent_info = []
         for file_info in recent_files:
             file_name = file_info.get('file_name', 'Unknown')[:25]
@@ -347,7 +346,7 @@ async def check_expired_callback(client: Client, query):
         await query.message.edit("🔄 **Starting expired file check...**\n\nThis will test file IDs to find expired ones.")
         
         # Simulate the expired file check process
-        test_files = list(primary_col.find().limit(10))
+        test_files = await primary_col.find().limit(10).to_list(length=None)
         expired_count = 0
         valid_count = 0
         
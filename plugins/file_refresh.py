@@ -5,7 +5,7 @@ import logging
 from hydrogram import Client, filters
 from hydrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from info import ADMINS
-from database.ia_filterdb import primary_col, secondary_col
+from database.ia_filterdb import primary_col, secondary_col, invalidate_search_cache
 
 logger = logging.getLogger(__name__)
 
@@ -54,7 +54,7 @@ async def check_invalid_files_command(client: Client, message: Message):
         await message.reply("🔍 **Checking for invalid file IDs...**")
         
         # Get sample of recent files
-        recent_files = list(primary_col.find().sort([("_id", -1)]).limit(10))
+        recent_files = await primary_col.find().sort([("_id", -1)]).limit(10).to_list(length=None)
         
         if not recent_files:
             await message.reply("📭 **No files found in database**")
@@ -162,12 +162,12 @@ async def database_stats_command(client: Client, message: Message):
     """Show database statistics"""
     try:
         # Get database stats
-        primary_count = primary_col.count_documents({})
-        secondary_count = secondary_col.count_documents({})
+        primary_count = await primary_col.count_documents({})
+        secondary_count = await secondary_col.count_documents({})
         total_files = primary_count + secondary_count
         
         # Get recent files info
-        recent_files = list(primary_col.find().sort([("_id", -1)]).limit(5))
+        recent_files = await primary_col.find().sort([("_id", -1)]).limit(5).to_list(length=None)
         
         recent_info = []
         for file_info in recent_files:
@@ -209,7 +209,7 @@ async def clean_invalid_files_command(client: Client, message: Message):
         await message.reply("🧹 **Cleaning Invalid Files...**")
         
         # Find files with obviously invalid IDs
-        all_files = list(primary_col.find())
+        all_files = await primary_col.find().to_list(length=None)
         
         to_remove = []
         for file_info in all_files:
@@ -282,8 +282,9 @@ async def confirm_clean_files_command(client: Client, message: Message):
         removed_count = 0
         for item in pending_removal:
             try:
-                result = primary_col.delete_one({'_id': item['id']})
+                result = await primary_col.delete_one({'_id': item['id']})
                 if result.deleted_count > 0:
+                    invalidate_search_cache(item['id'])
                     removed_count += 1
             except Exception as e:
                 logger.error(f"Error removing file {item['id']}: {e}")
@@ -3,21 +3,60 @@ import asyncio
 from hydrogram import Client, filters, enums
 from hydrogram.errors import FloodWait
 from hydrogram.errors.exceptions.bad_request_400 import ChannelInvalid, ChatAdminRequired, UsernameInvalid, UsernameNotModified
-from info import ADMINS
+from info import ADMINS, INDEX_CONCURRENCY
 from info import INDEX_REQ_CHANNEL as LOG_CHANNEL
-from database.ia_filterdb import save_file
+from database.ia_filterdb import save_files
+from database.users_chats_db import db
 from hydrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from utils import temp
+from ratelimit import PRIORITY, BACKGROUND
 import re
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
-lock = asyncio.Lock()
+# Media saved per bulk write while indexing; jobs also checkpoint this often
+INDEX_BATCH_SIZE = 200
+# Several chats can be indexed at once: one lock per chat, at most
+# INDEX_CONCURRENCY jobs scanning, and a cancel token per running job. The
+# token is registered before the first await of a job, so it also claims the
+# chat against a second start.
+INDEX_LOCKS = {}
+INDEX_SLOTS = asyncio.Semaphore(INDEX_CONCURRENCY)
+CANCEL_TOKENS = {}
+
+
+def chat_lock(chat):
+    return INDEX_LOCKS.setdefault(chat, asyncio.Lock())
+
+
+def claim_chat(chat):
+    """Register a job's cancel token, None if chat already has a job"""
+    if chat in CANCEL_TOKENS:
+        return None
+    cancel = CANCEL_TOKENS[chat] = asyncio.Event()
+    return cancel
+
+
+def release_chat(chat, cancel):
+    if CANCEL_TOKENS.get(chat) is cancel:
+        del CANCEL_TOKENS[chat]
+
+
+def cancel_markup(chat):
+    return InlineKeyboardMarkup([[InlineKeyboardButton('Cancel', callback_data=f'index_cancel#{chat}')]])
 
 
 @Client.on_callback_query(filters.regex(r'^index'))
 async def index_files(bot, query):
     if query.data.startswith('index_cancel'):
-        temp.CANCEL = True
+        if '#' in query.data:
+            chat = query.data.split('#', 1)[1]
+            token = CANCEL_TOKENS.get(int(chat) if chat.lstrip('-').isdigit() else chat)
+            tokens = [token] if token else []
+        else:
+            # Buttons sent before jobs had their own token cancel everything
+            tokens = list(CANCEL_TOKENS.values())
+        for token in tokens:
+            token.set()
         return await query.answer("Cancelling Indexing")
     _, raju, chat, lst_msg_id, from_user = query.data.split("#")
     if raju == 'reject':
@@ -27,26 +66,29 @@ async def index_files(bot, query):
                                reply_to_message_id=int(lst_msg_id))
         return
 
-    if lock.locked():
-        return await query.answer('Wait until previous process complete.', show_alert=True)
-    msg = query.message
-
-    await query.answer('Processing...⏳', show_alert=True)
-    if int(from_user) not in ADMINS:
-        await bot.send_message(int(from_user),
-                               f'Your Submission for indexing {chat} has been accepted by our moderators and will be added soon.',
-                               reply_to_message_id=int(lst_msg_id))
-    await msg.edit(
-        "Starting Indexing",
-        reply_markup=InlineKeyboardMarkup(
-            [[InlineKeyboardButton('Cancel', callback_data='index_cancel')]]
-        )
-    )
     try:
         chat = int(chat)
     except:
         chat = chat
-    await index_files_to_db(int(lst_msg_id), chat, msg, bot)
+    cancel = claim_chat(chat)
+    if cancel is None:
+        return await query.answer('This chat is already being indexed.', show_alert=True)
+    msg = query.message
+
+    try:
+        await query.answer('Processing...⏳', show_alert=True)
+        if int(from_user) not in ADMINS:
+            await bot.send_message(int(from_user),
+                                   f'Your Submission for indexing {chat} has been accepted by our moderators and will be added soon.',
+                                   reply_to_message_id=int(lst_msg_id))
+        await msg.edit(
+            "Starting Indexing",
+            reply_markup=cancel_markup(chat)
+        )
+        job = await db.save_index_job(chat, int(lst_msg_id), temp.CURRENT, msg.chat.id)
+        await index_files_to_db(job, msg, bot, cancel)
+    finally:
+        release_chat(chat, cancel)
 
 
 @Client.on_message((filters.forwarded | filters.regex(r"(https://)?(t\.me/|telegram\.me/|telegram\.dog/)(c/)?(\d+|[a-zA-Z_0-9]+)/(\d+)$")) & filters.private & filters.incoming)
@@ -134,28 +176,136 @@ async def set_skip_number(bot, message):
         await message.reply("Give me a skip number")
 
 
-async def index_files_to_db(lst_msg_id, chat, msg, bot):
-    total_files = 0
-    duplicate = 0
-    errors = 0
-    deleted = 0
-    no_media = 0
-    unsupported = 0
-    async with lock:
+def rate(scan, count, seconds):
+    return round(scan[count] / scan[seconds]) if scan.get(seconds) else 0
+
+
+def parse_chat(text):
+    chat = text.split(" ", 1)[1].strip()
+    try:
+        return int(chat)
+    except ValueError:
+        return chat
+
+
+@Client.on_message(filters.command('indexjobs') & filters.user(ADMINS))
+async def list_index_jobs(bot, message):
+    jobs = await db.get_index_jobs()
+    if not jobs:
+        return await message.reply("No indexing jobs.")
+    text = "<b>Indexing jobs</b>\n"
+    for job in jobs:
+        saved = job.get('counters', {}).get('total_files', 0)
+        text += f"\n<code>{job['chat']}</code> - {job['status']} - message {job['cursor']}/{job['last_msg_id']}, saved {saved}"
+    await message.reply(text)
+
+
+@Client.on_message(filters.command('pauseindex') & filters.user(ADMINS))
+async def pause_index_job(bot, message):
+    if ' ' not in message.text:
+        return await message.reply("Give me the chat id of the job")
+    chat = parse_chat(message.text)
+    job = await db.get_index_job(chat)
+    if not job or job['status'] != 'running':
+        return await message.reply("That job is not running.")
+    await db.set_index_job_status(chat, 'paused')
+    if chat in CANCEL_TOKENS:
+        CANCEL_TOKENS[chat].set()
+    await message.reply(f"Pausing indexing of <code>{chat}</code>")
+
+
+@Client.on_message(filters.command('resumeindex') & filters.user(ADMINS))
+async def resume_index_job(bot, message):
+    if ' ' not in message.text:
+        return await message.reply("Give me the chat id of the job")
+    chat = parse_chat(message.text)
+    job = await db.get_index_job(chat)
+    if not job or job['status'] in ('running', 'done'):
+        return await message.reply("Nothing to resume for that chat.")
+    if chat in CANCEL_TOKENS:
+        return await message.reply('This chat is already being indexed.')
+    await db.set_index_job_status(chat, 'running')
+    await run_index_job(bot, chat)
+
+
+async def run_index_job(bot, chat):
+    """Continue a stored job from its last checkpoint"""
+    cancel = claim_chat(chat)
+    if cancel is None:
+        return
+    try:
+        job = await db.get_index_job(chat)
+        if not job or job['status'] != 'running':
+            return
+        msg = await bot.send_message(
+            job['msg_chat'],
+            f"Resuming indexing of <code>{chat}</code> from message <code>{job['cursor']}</code>",
+            reply_markup=cancel_markup(chat)
+        )
+        await index_files_to_db(job, msg, bot, cancel)
+    finally:
+        release_chat(chat, cancel)
+
+
+async def resume_index_jobs(bot):
+    """Pick up the jobs a crash or redeploy left running"""
+    jobs = await db.get_index_jobs('running')
+    results = await asyncio.gather(*(run_index_job(bot, job['chat']) for job in jobs), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.exception(result)
+
+
+async def index_files_to_db(job, msg, bot, cancel):
+    chat = job['chat']
+    counters = job.get('counters', {})
+    total_files = counters.get('total_files', 0)
+    duplicate = counters.get('duplicate', 0)
+    errors = counters.get('errors', 0)
+    deleted = counters.get('deleted', 0)
+    no_media = counters.get('no_media', 0)
+    unsupported = counters.get('unsupported', 0)
+    batch = []
+    scan = {}
+
+    async def checkpoint(current):
+        """Save the pending batch, then record every message below current as done"""
+        nonlocal total_files, duplicate, errors
+        if batch:
+            for aynav, vnay in await save_files(batch):
+                if aynav:
+                    total_files += 1
+                elif vnay == 0:
+                    duplicate += 1
+                elif vnay == 2:
+                    errors += 1
+            batch.clear()
+        await db.update_index_job(chat, cursor=current, counters=dict(
+            total_files=total_files, duplicate=duplicate, errors=errors,
+            deleted=deleted, no_media=no_media, unsupported=unsupported
+        ))
+
+    async with chat_lock(chat), INDEX_SLOTS:
+        # Scanning yields the Telegram budget to users' requests
+        priority = PRIORITY.set(BACKGROUND)
         try:
-            current = temp.CURRENT
-            temp.CANCEL = False
+            current = job['cursor']
             try:
-                async for message in bot.iter_messages(chat, lst_msg_id, temp.CURRENT):
-                    if temp.CANCEL:
-                        await msg.edit(f"Successfully Cancelled!!\n\nSaved <code>{total_files}</code> files to dataBase!\nDuplicate Files Skipped: <code>{duplicate}</code>\nDeleted Messages Skipped: <code>{deleted}</code>\nNon-Media messages skipped: <code>{no_media + unsupported}</code>(Unsupported Media - `{unsupported}` )\nErrors Occurred: <code>{errors}</code>")
-                        break
+                async for message in bot.iter_messages(chat, job['last_msg_id'], current, stats=scan):
+                    if cancel.is_set():
+                        await checkpoint(current)
+                        await db.update_index_job(chat, status='cancelled')
+                        job = await db.get_index_job(chat)
+                        state = 'Paused' if job and job['status'] == 'paused' else 'Cancelled'
+                        await msg.edit(f"Successfully {state}!!\n\nSaved <code>{total_files}</code> files to dataBase!\nDuplicate Files Skipped: <code>{duplicate}</code>\nDeleted Messages Skipped: <code>{deleted}</code>\nNon-Media messages skipped: <code>{no_media + unsupported}</code>(Unsupported Media - `{unsupported}` )\nErrors Occurred: <code>{errors}</code>")
+                        return
+                    if len(batch) >= INDEX_BATCH_SIZE or current % INDEX_BATCH_SIZE == 0:
+                        await checkpoint(current)
                     current += 1
                     if current % 20 == 0:
-                        can = [[InlineKeyboardButton('Cancel', callback_data='index_cancel')]]
-                        reply = InlineKeyboardMarkup(can)
+                        reply = cancel_markup(chat)
                         await msg.edit_text(
-                            text=f"Total messages fetched: <code>{current}</code>\nTotal messages saved: <code>{total_files}</code>\nDuplicate Files Skipped: <code>{duplicate}</code>\nDeleted Messages Skipped: <code>{deleted}</code>\nNon-Media messages skipped: <code>{no_media + unsupported}</code>(Unsupported Media - `{unsupported}` )\nErrors Occurred: <code>{errors}</code>",
+                            text=f"Total messages fetched: <code>{current}</code>\nTotal messages saved: <code>{total_files}</code>\nDuplicate Files Skipped: <code>{duplicate}</code>\nDeleted Messages Skipped: <code>{deleted}</code>\nNon-Media messages skipped: <code>{no_media + unsupported}</code>(Unsupported Media - `{unsupported}` )\nErrors Occurred: <code>{errors}</code>\nSpeed: fetch <code>{rate(scan, 'fetched', 'fetch_time')}</code> / process <code>{rate(scan, 'processed', 'process_time')}</code> msg/s",
                             reply_markup=reply)
                     if message.empty:
                         deleted += 1
@@ -172,22 +322,23 @@ async def index_files_to_db(lst_msg_id, chat, msg, bot):
                         continue
                     media.file_type = message.media.value
                     media.caption = message.caption
-                    aynav, vnay = await save_file(media)
-                    if aynav:
-                        total_files += 1
-                    elif vnay == 0:
-                        duplicate += 1
-                    elif vnay == 2:
-                        errors += 1
+                    batch.append(media)
+                await checkpoint(current)
+                await db.update_index_job(chat, status='done')
             except Exception as iter_error:
                 logger.error(f"Error during iteration: {iter_error}")
+                await checkpoint(current)
                 if "'ChannelForbidden' object has no attribute 'verified'" in str(iter_error):
+                    await db.update_index_job(chat, status='done')
                     await msg.edit(f"⚠️ Indexing completed with parsing errors (some messages skipped)\\n\\nSaved <code>{total_files}</code> to dataBase!\\nDuplicate Files Skipped: <code>{duplicate}</code>\\nDeleted Messages Skipped: <code>{deleted}</code>\\nNon-Media messages skipped: <code>{no_media + unsupported}</code>(Unsupported Media - `{unsupported}` )\\nErrors Occurred: <code>{errors}</code>")
                     return
                 else:
                     raise iter_error
         except Exception as e:
             logger.exception(e)
+            await db.update_index_job(chat, status='failed')
             await msg.edit(f'Error: {e}')
         else:
             await msg.edit(f'Succesfully saved <code>{total_files}</code> to dataBase!\nDuplicate Files Skipped: <code>{duplicate}</code>\nDeleted Messages Skipped: <code>{deleted}</code>\nNon-Media messages skipped: <code>{no_media + unsupported}</code>(Unsupported Media - `{unsupported}` )\nErrors Occurred: <code>{errors}</code>')
+        finally:
+            PRIORITY.reset(priority)
@@ -2,14 +2,18 @@ import logging
 from hydrogram import Client, filters
 from hydrogram.errors.exceptions.bad_request_400 import QueryIdInvalid
 from hydrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultCachedDocument, InlineQuery
-from database.ia_filterdb import get_search_results
+from database.ia_filterdb import get_search_ids, get_files_by_ids
 from utils import is_subscribed, get_size, temp
-from info import CACHE_TIME, AUTH_USERS, AUTH_CHANNEL, CUSTOM_FILE_CAPTION
-from plugins.pm_filter import next_back
+from cache import LRUCache
+from info import CACHE_TIME, AUTH_USERS, AUTH_CHANNEL, CUSTOM_FILE_CAPTION, INLINE_CURSOR_CACHE_SIZE, INLINE_CURSOR_TTL
 
 logger = logging.getLogger(__name__)
 cache_time = 0 if AUTH_USERS or AUTH_CHANNEL else CACHE_TIME
 
+# Ordered result ids of a user's inline search, so scrolling only fetches the
+# next 10 files instead of running the whole search again for every offset
+INLINE_CURSORS = LRUCache('inline_cursors', INLINE_CURSOR_CACHE_SIZE, ttl=INLINE_CURSOR_TTL)
+
 @Client.on_inline_query()
 async def answer(bot, query):
     """Show search results for given inline query"""
@@ -32,8 +36,16 @@ async def answer(bot, query):
 
     offset = int(query.offset or 0)
     reply_markup = get_reply_markup(query=string)
-    all_total = await get_search_results(string)
-    files, next_offset, total = await next_back(all_total, max_results=10, offset=offset)
+    cursor_key = (query.from_user.id, string, file_type)
+    ids = INLINE_CURSORS.get(cursor_key) if offset else None
+    if ids is None:
+        ids = tuple(await get_search_ids(string, file_type=file_type))
+        INLINE_CURSORS.set(cursor_key, ids)
+    files = await get_files_by_ids(ids[offset:offset + 10])
+    total = len(ids)
+    next_offset = offset + 10
+    if next_offset >= total:
+        next_offset = ''
 
     for file in files:
         title=file['file_name']
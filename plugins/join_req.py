@@ -1,18 +1,62 @@
+import logging
 from hydrogram import Client, filters, enums
-from hydrogram.types import ChatJoinRequest
+from hydrogram.types import ChatJoinRequest, ChatMemberUpdated
 from database.users_chats_db import db
 from info import ADMINS, AUTH_CHANNEL
-from utils import temp
+from utils import temp, cache_membership, record_membership, forget_join_requests, load_membership, MEMBER_STATUSES, MEMBER_TABLE
+from plugins.simple_channel_handler import REQUIRED_CHANNEL_IDS, ENABLE_CHANNEL_CHECKING
+
+logger = logging.getLogger(__name__)
+
+
+def gated_channels():
+  """Channels whose membership decides access to the bot"""
+  return list(temp.AUTH_CHANNEL) + (REQUIRED_CHANNEL_IDS if ENABLE_CHANNEL_CHECKING else [])
 
 
 @Client.on_chat_join_request()
 async def join_reqs(client, message: ChatJoinRequest):
+  # A pending request already counts as subscribed for the gate, but only for
+  # MEMBER_CACHE_TTL: a declined request sends no chat member update
+  cache_membership(message.from_user.id, message.chat.id, True)
   if message.chat.id in temp.AUTH_CHANNEL:
     if not await db.find_join_req(message.from_user.id):
       await db.add_join_req(message.from_user.id)
 
 
+@Client.on_chat_member_updated()
+async def member_updated(client, update: ChatMemberUpdated):
+  # Joins, leaves and bans in the gated channels keep the member table current
+  if update.chat.id not in gated_channels():
+    return
+  member = update.new_chat_member or update.old_chat_member
+  if not member or not member.user:
+    return
+  is_member = bool(update.new_chat_member) and update.new_chat_member.status in MEMBER_STATUSES
+  await record_membership(member.user.id, update.chat.id, is_member)
+
+
+async def bootstrap_membership(client):
+  """Load the stored member table, then add the members Telegram lets a bot
+  list in each gated channel (bots only see part of a channel's members)"""
+  await load_membership()
+  for channel in gated_channels():
+    try:
+      members = [m.user.id async for m in client.get_chat_members(channel) if m.user and m.status in MEMBER_STATUSES]
+    except Exception as e:
+      logger.warning(f"Could not list members of {channel}: {e}")
+      continue
+    table = MEMBER_TABLE.setdefault(channel, {})
+    new = [user_id for user_id in members if table.get(user_id) is not True]
+    for user_id in new:
+      table[user_id] = True
+    await db.update_members(channel, new)
+    logger.info(f"Bootstrapped {len(new)} members of {channel}")
+
+
 @Client.on_message(filters.command("delreq") & filters.private & filters.user(ADMINS))
 async def del_requests(client, message):
+  user_ids = list(db.join_reqs)
   await db.del_join_req()
+  await forget_join_requests(user_ids, gated_channels())
   await message.reply('Deleted!')
@@ -5,6 +5,7 @@ from info import ADMINS, LOG_CHANNEL, SUPPORT_CHAT, MELCOW_NEW_USERS
 from database.users_chats_db import db
 from database.ia_filterdb import get_database_count, get_database_size
 from utils import get_size, temp
+from cache import CACHES, FLIGHTS
 from Script import script
 from hydrogram.errors import ChatAdminRequired
 import psutil
@@ -40,12 +41,27 @@ async def get_ststs(bot, message):
     rju = await message.reply('Fetching stats..')
     total_users = await db.total_users_count()
     totl_chats = await db.total_chat_count()
-    primary_count, secondary_count= get_database_count()
+    primary_count, secondary_count= await get_database_count()
     db_size = get_size(await db.get_db_size())
-    primary_size, secondary_size = get_database_size()
+    primary_size, secondary_size = await get_database_size()
     await rju.edit(script.STATUS_TXT.format(primary_count, get_size(primary_size), secondary_count, get_size(secondary_size), total_users, totl_chats, db_size, get_size(psutil.virtual_memory().total), get_size(psutil.virtual_memory().used)))
 
 
+@Client.on_message(filters.command('cachestats') & filters.user(ADMINS))
+async def cache_stats(bot, message):
+    out = "<b>In-process caches:</b>\n\n"
+    for name, cache in CACHES.items():
+        st = cache.stats()
+        usage = f"{st['size']} entries, {get_size(st['weight'])}/{get_size(st['maxsize'])}" if cache.sizeof else f"{st['size']}/{st['maxsize']} entries"
+        out += f"<b>{name}</b> - {usage}, hits: <code>{st['hits']}</code>, misses: <code>{st['misses']}</code>, hit rate: <code>{st['hit_rate']:.1%}</code>, evictions: <code>{st['evictions']}</code>, expired: <code>{st['expired']}</code>\n"
+    for name, flight in FLIGHTS.items():
+        st = flight.stats()
+        out += f"<b>{name}</b> (coalescing) - in flight: <code>{st['in_flight']}</code>, calls: <code>{st['calls']}</code>, coalesced: <code>{st['coalesced']}</code>\n"
+    st = bot.limiter.stats()
+    out += f"\n<b>Telegram limiter</b> - rate: <code>{st['rate']}/s</code>, users waiting: <code>{st['waiting']}</code>, slowed: <code>{', '.join(st['slowed_methods']) or 'none'}</code>\n"
+    await message.reply(out)
+
+
 @Client.on_message(filters.command('invite') & filters.user(ADMINS))
 async def gen_invite(bot, message):
     if len(message.command) == 1:
@@ -7,15 +7,16 @@ from hydrogram.errors.exceptions.bad_request_400 import MediaEmpty, PhotoInvalid
 from Script import script
 import hydrogram
 from info import ADMINS, P_TTI_SHOW_OFF, AUTH_CHANNEL, NON_AUTH_GROUPS, AUTH_USERS, CUSTOM_FILE_CAPTION, AUTH_GROUPS, P_TTI_SHOW_OFF, IMDB, \
-    SINGLE_BUTTON, SPELL_CHECK_REPLY, IMDB_TEMPLATE, LOG_CHANNEL, PICS
+    SINGLE_BUTTON, SPELL_CHECK_REPLY, IMDB_TEMPLATE, LOG_CHANNEL, PICS, SEARCH_SESSION_MEMORY, SEARCH_SESSION_TTL
 from hydrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from hydrogram import Client, filters, enums
 from hydrogram.errors import FloodWait, UserIsBlocked, MessageNotModified, PeerIdInvalid
 from utils import format_size, remove_username_from_filename, get_size, is_subscribed, get_poster, temp
 from database.users_chats_db import db
-from database.ia_filterdb import delete_func, get_database_count, get_file_details, get_search_results, get_delete_results, get_database_size
+from database.ia_filterdb import delete_func, get_database_count, get_file_details, get_search_facets, get_files_by_ids, get_delete_results, get_database_size, LANGUAGES, RESOLUTIONS
 from real_subtitle_handler import real_subtitle_handler as subtitle_handler
-import logging, random, psutil
+from cache import LRUCache
+import logging, random, psutil, sys
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -97,23 +98,99 @@ async def send_subtitle_file(client, user_id, movie_name, language, display_name
         )
         return False
 
-BUTTONS = {}
 SPELL_CHECK = {}
-ORIGINAL_FILES = {}
-SELECTIONS = {}
-FILES = {}
-RESOLUTIONS = ['480p', '540p', '720p', '1080p', '2160p']
-LANGUAGES = ['english', 'tamil', 'hindi', 'malayalam', 'telugu', 'korean', 'sinhala']
 
 
+CATEGORIES = ['movie', 'series']
+
+
+def build_bitset(positions, size):
+    """Pack result positions into an int with one bit per result"""
+    bits = bytearray((size + 7) // 8)
+    for i in positions:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class SearchSession:
+    """State behind one result message: the query, the chosen filters, the
+    ordered ids of every match and a bitset per facet value over them"""
+    __slots__ = ('search', 'selections', 'all_ids', 'facets', 'ids', 'nbytes')
+
+    def __init__(self, search, results):
+        self.search = search
+        self.selections = {'language': 'any', 'resolution': 'any', 'category': 'any'}
+        self.all_ids = tuple(doc['_id'] for doc in results)
+
+        # A single pass over the results records where each facet value occurs
+        positions = {
+            'language': {lang: [] for lang in LANGUAGES},
+            'resolution': {resltn: [] for resltn in RESOLUTIONS},
+            'category': {catgry: [] for catgry in CATEGORIES},
+        }
+        for i, doc in enumerate(results):
+            for lang in doc.get('languages') or ():
+                if lang in positions['language']:
+                    positions['language'][lang].append(i)
+            if doc.get('resolution') in positions['resolution']:
+                positions['resolution'][doc['resolution']].append(i)
+            positions['category']['series' if doc.get('is_series') else 'movie'].append(i)
+        size = len(self.all_ids)
+        self.facets = {
+            field: {value: build_bitset(found, size) for value, found in values.items()}
+            for field, values in positions.items()
+        }
+        self.ids = self.all_ids
+        # The filtered id tuple is counted as if it were a full copy
+        self.nbytes = (
+            sys.getsizeof(self.all_ids) +
+            sys.getsizeof(self.all_ids) + sum(sys.getsizeof(i) for i in self.all_ids) +
+            sum(sys.getsizeof(bits) for values in self.facets.values() for bits in values.values()) +
+            sys.getsizeof(self.search) + 512
+        )
+
+    def mask(self, selections, skip=None):
+        """AND together the bitsets of every selected facet except ``skip``"""
+        mask = (1 << len(self.all_ids)) - 1
+        for field, value in selections.items():
+            if field != skip and value != 'any':
+                mask &= self.facets[field][value]
+        return mask
+
+    def count(self, field, value):
+        """How many results remain if ``field`` is switched to ``value``"""
+        mask = self.mask(self.selections, skip=field)
+        if value != 'any':
+            mask &= self.facets[field][value]
+        return bin(mask).count('1')
+
+    def select(self, selections):
+        """Apply new selections, return False and change nothing if none match"""
+        mask = self.mask(selections)
+        if not mask:
+            return False
+        self.selections = selections
+        if mask == (1 << len(self.all_ids)) - 1:
+            self.ids = self.all_ids
+        else:
+            # bin() lists bits from the highest, so reverse it to walk positions in order
+            self.ids = tuple(self.all_ids[i] for i, bit in enumerate(bin(mask)[:1:-1]) if bit == '1')
+        return True
+
 
-async def next_back(data, offset=0, max_results=0):
-    out_data = data[offset:][:max_results]
-    total_results = len(data)
+# Sessions live as long as the result message (deleted after SEARCH_SESSION_TTL)
+# and the least recently used ones are dropped once the memory budget is spent
+SESSIONS = LRUCache('search_sessions', SEARCH_SESSION_MEMORY, ttl=SEARCH_SESSION_TTL, sizeof=lambda session: session.nbytes)
+
+
+async def get_session_page(session, offset=0, max_results=10):
+    """Slice a page of ids out of the session and fetch just those files"""
+    files = await get_files_by_ids(session.ids[offset:offset + max_results])
+    total = len(session.ids)
     next_offset = offset + max_results
-    if next_offset >= total_results:
+    if next_offset >= total:
         next_offset = ''
-    return out_data, next_offset, total_results
+    return files, next_offset, total
 
 
 @Client.on_message((filters.group | filters.private) & filters.text & filters.incoming)
@@ -146,13 +223,14 @@ async def next_page(bot, query, cd=None):
         offset = int(offset)
     except:
         offset = 0
-    search = BUTTONS.get(key)
-    if not search:
+    session = SESSIONS.get(key)
+    if not session:
         await query.answer("You are using one of my old messages, please send the request again.", show_alert=True)
         return
     
-    selections = SELECTIONS.get(key)
-    files, n_offset, total = await next_back(FILES.get(key), max_results=10, offset=offset)
+    search = session.search
+    selections = session.selections
+    files, n_offset, total = await get_session_page(session, offset=offset, max_results=10)
 
     try:
         n_offset = int(n_offset)
@@ -223,18 +301,20 @@ async def language(bot, query):
     if int(req) != query.from_user.id:
         return await query.answer("not for you", show_alert=True)
 
-    search = BUTTONS.get(key)
-    selections = SELECTIONS.get(key)
-    if not search:
+    session = SESSIONS.get(key)
+    if not session:
         await query.answer("request again", show_alert=True)
         return
+    search = session.search
+    selections = session.selections
+    counts = {lang: session.count('language', lang) for lang in LANGUAGES + ['any']}
     btn = [[
-        InlineKeyboardButton(text=f"» {lang.title()} «" if selections.get('language') == lang else lang.title(), callback_data=f"lang_select#{req}#{key}#{lang}")
+        InlineKeyboardButton(text=f"» {lang.title()} ({counts[lang]}) «" if selections.get('language') == lang else f"{lang.title()} ({counts[lang]})", callback_data=f"lang_select#{req}#{key}#{lang}")
     ]
-        for lang in LANGUAGES
+        for lang in LANGUAGES if counts[lang] or selections.get('language') == lang
     ]
     btn.append(
-        [InlineKeyboardButton("» Any Language «" if selections.get('language') == "any" else "Any Language", callback_data=f"lang_select#{req}#{key}#any")]
+        [InlineKeyboardButton(f"» Any Language ({counts['any']}) «" if selections.get('language') == "any" else f"Any Language ({counts['any']})", callback_data=f"lang_select#{req}#{key}#any")]
     )
     await query.message.edit(f'Select you want <b>" {search} "</b> language.', reply_markup=InlineKeyboardMarkup(btn))
 
@@ -244,28 +324,18 @@ async def lang_select(bot, query):
     ident, req, key, lang = query.data.split("#")
     if int(req) != query.from_user.id:
         return await query.answer("not for you", show_alert=True)
+    await apply_selection(bot, query, req, key, 'language', lang)
 
-    original_files = ORIGINAL_FILES.get(key)
-    if not original_files:
+
+async def apply_selection(bot, query, req, key, field, value):
+    """Switch one filter and re-render page one, keeping the old one if nothing matches"""
+    session = SESSIONS.get(key)
+    if not session:
         await query.answer("request again", show_alert=True)
         return
-    
-    files = original_files  # Filtered files will be original files
-    if lang != 'any' and not any([file for file in files if lang in file['file_name'].lower()]):
-        return await query.answer('results not found for this language', show_alert=True)
-    SELECTIONS[key]['language'] = lang
-    selections = SELECTIONS.get(key)
-    filtered_files = [
-        file for file in files
-        if (selections.get('language') == 'any' or selections.get('language') in file['file_name'].lower()) and
-           (selections.get('resolution') == 'any' or selections.get('resolution') in file['file_name'].lower()) and
-           (selections.get('category') == 'any' or
-            (selections.get('category') == 'series' and re.search(r's\d{1,2}e\d{1,2}', file['file_name'].lower())) or
-            (selections.get('category') == 'movie' and not re.search(r's\d{1,2}e\d{1,2}', file['file_name'].lower())))
-    ]
-    if not filtered_files:
+
+    if not session.select(dict(session.selections, **{field: value})):
         return await query.answer('results not found with the currently selected filters', show_alert=True)
-    FILES[key] = filtered_files
 
     cd = (req, key, 0)
     await next_page(bot, query, cd=cd)
@@ -277,18 +347,20 @@ async def resolution(bot, query):
     if int(req) != query.from_user.id:
         return await query.answer("not for you", show_alert=True)
 
-    search = BUTTONS.get(key)
-    selections = SELECTIONS.get(key)
-    if not search:
+    session = SESSIONS.get(key)
+    if not session:
         await query.answer("request again", show_alert=True)
         return
+    search = session.search
+    selections = session.selections
+    counts = {resltn: session.count('resolution', resltn) for resltn in RESOLUTIONS + ['any']}
     btn = [[
-        InlineKeyboardButton(text=f"» {resltn} «" if selections.get('resolution') == resltn else resltn, callback_data=f"resltn_select#{req}#{key}#{resltn}")
+        InlineKeyboardButton(text=f"» {resltn} ({counts[resltn]}) «" if selections.get('resolution') == resltn else f"{resltn} ({counts[resltn]})", callback_data=f"resltn_select#{req}#{key}#{resltn}")
     ]
-        for resltn in RESOLUTIONS
+        for resltn in RESOLUTIONS if counts[resltn] or selections.get('resolution') == resltn
     ]
     btn.append(
-        [InlineKeyboardButton("» Any Resolution «" if selections.get('resolution') == "any" else "Any Resolution", callback_data=f"resltn_select#{req}#{key}#any")]
+        [InlineKeyboardButton(f"» Any Resolution ({counts['any']}) «" if selections.get('resolution') == "any" else f"Any Resolution ({counts['any']})", callback_data=f"resltn_select#{req}#{key}#any")]
     )
     await query.message.edit(f'Select you want <b>" {search} "</b> resolution.', reply_markup=InlineKeyboardMarkup(btn))
 
@@ -298,32 +370,7 @@ async def resltn_select(bot, query):
     ident, req, key, resltn = query.data.split("#")
     if int(req) != query.from_user.id:
         return await query.answer("not for you", show_alert=True)
-
-    search = BUTTONS.get(key)
-    original_files = ORIGINAL_FILES.get(key)
-    if not search:
-        await query.answer("request again", show_alert=True)
-        return
-    
-    files = original_files  # Filtered files will be original files
-    if resltn != 'any' and not any([file for file in files if resltn in file['file_name'].lower()]):
-        return await query.answer('results not found for this resolution', show_alert=True)
-    SELECTIONS[key]['resolution'] = resltn
-    selections = SELECTIONS.get(key)
-    filtered_files = [
-        file for file in files
-        if (selections.get('language') == 'any' or selections.get('language') in file['file_name'].lower()) and
-           (selections.get('resolution') == 'any' or selections.get('resolution') in file['file_name'].lower()) and
-           (selections.get('category') == 'any' or
-            (selections.get('category') == 'series' and re.search(r's\d{1,2}e\d{1,2}', file['file_name'].lower())) or
-            (selections.get('category') == 'movie' and not re.search(r's\d{1,2}e\d{1,2}', file['file_name'].lower())))
-    ]
-    if not filtered_files:
-        return await query.answer('results not found with the currently selected filters', show_alert=True)
-    FILES[key] = filtered_files
-
-    cd = (req, key, 0)
-    await next_page(bot, query, cd=cd)
+    await apply_selection(bot, query, req, key, 'resolution', resltn)
     
 
 @Client.on_callback_query(filters.regex(r"^category"))
@@ -332,18 +379,20 @@ async def category(bot, query):
     if int(req) != query.from_user.id:
         return await query.answer("not for you", show_alert=True)
 
-    search = BUTTONS.get(key)
-    selections = SELECTIONS.get(key)
-    if not search:
+    session = SESSIONS.get(key)
+    if not session:
         await query.answer("request again", show_alert=True)
         return
-    btn = [[
-        InlineKeyboardButton(text="» Movie «" if selections.get('category') == 'movie' else 'Movie', callback_data=f"catgry_select#{req}#{key}#movie")
-    ],[
-        InlineKeyboardButton(text="» TV Series «" if selections.get('category') == 'series' else 'TV Series', callback_data=f"catgry_select#{req}#{key}#series")
-    ],[
-        InlineKeyboardButton(text="» Any Category «" if selections.get('category') == 'any' else 'Any Category', callback_data=f"catgry_select#{req}#{key}#any")
-    ]]
+    search = session.search
+    selections = session.selections
+    labels = {'movie': 'Movie', 'series': 'TV Series', 'any': 'Any Category'}
+    btn = []
+    for catgry in CATEGORIES + ['any']:
+        count = session.count('category', catgry)
+        if not count and catgry != 'any' and selections.get('category') != catgry:
+            continue
+        text = f"{labels[catgry]} ({count})"
+        btn.append([InlineKeyboardButton(text=f"» {text} «" if selections.get('category') == catgry else text, callback_data=f"catgry_select#{req}#{key}#{catgry}")])
     await query.message.edit(f'Select you want <b>" {search} "</b> category.', reply_markup=InlineKeyboardMarkup(btn))
 
 @Client.on_callback_query(filters.regex(r"^catgry_select"))
@@ -351,35 +400,7 @@ async def catgry_select(bot, query):
     ident, req, key, catgry = query.data.split("#")
     if int(req) != query.from_user.id:
         return await query.answer("not for you", show_alert=True)
-
-    search = BUTTONS.get(key)
-    original_files = ORIGINAL_FILES.get(key)
-    if not search:
-        await query.answer("request again", show_alert=True)
-        return
-    
-    files = original_files  # Filtered files will be original files
-    if catgry != 'any' and not any(
-        (catgry == 'series' and re.search(r's\d{1,2}e\d{1,2}', file['file_name'].lower())) or
-        (catgry == 'movie' and not re.search(r's\d{1,2}e\d{1,2}', file['file_name'].lower()))
-        for file in files):
-        return await query.answer('results not found for this category', show_alert=True)
-    SELECTIONS[key]['category'] = catgry
-    selections = SELECTIONS.get(key)
-    filtered_files = [
-        file for file in files
-        if (selections.get('language') == 'any' or selections.get('language') in file['file_name'].lower()) and
-           (selections.get('resolution') == 'any' or selections.get('resolution') in file['file_name'].lower()) and
-           (selections.get('category') == 'any' or
-            (selections.get('category') == 'series' and re.search(r's\d{1,2}e\d{1,2}', file['file_name'].lower())) or
-            (selections.get('category') == 'movie' and not re.search(r's\d{1,2}e\d{1,2}', file['file_name'].lower())))
-    ]
-    if not filtered_files:
-        return await query.answer('results not found with the currently selected filters', show_alert=True)
-    FILES[key] = filtered_files
-
-    cd = (req, key, 0)
-    await next_page(bot, query, cd=cd)
+    await apply_selection(bot, query, req, key, 'category', catgry)
     
 
 @Client.on_callback_query()
@@ -1007,11 +1028,11 @@ async def cb_handler(client: Client, query: CallbackQuery):
             InlineKeyboardButton('🔄 ReFreѕн', callback_data='stats')
         ]]
         reply_markup = InlineKeyboardMarkup(buttons)
-        primary_count, secondary_count= get_database_count()
+        primary_count, secondary_count= await get_database_count()
         users = await db.total_users_count()
         chats = await db.total_chat_count()
         db_size = get_size(await db.get_db_size())
-        primary_size, secondary_size = get_database_size()
+        primary_size, secondary_size = await get_database_size()
         await query.message.edit_text(
             text=script.STATUS_TXT.format(primary_count, get_size(primary_size), secondary_count, get_size(secondary_size), users, chats, db_size, get_size(psutil.virtual_memory().total), get_size(psutil.virtual_memory().used)),
             reply_markup=reply_markup,
@@ -1113,8 +1134,8 @@ async def auto_filter(client, msg, spoll=False):
             return
 
     search = re.sub(r"(_|\-|\.|\+)", " ", message.text.strip())
-    all_files = await get_search_results(search)
-    if not all_files:
+    results = await get_search_facets(search)
+    if not results:
         # Clean search query for URL
         clean_search = "".join(c for c in search if c.isalnum() or c.isspace()).strip()
         google_url = f"https://www.google.com/search?q={clean_search.replace(' ', '+')}"
@@ -1125,9 +1146,9 @@ async def auto_filter(client, msg, spoll=False):
         await asyncio.sleep(120)
         await v.delete()
         return
-    
 
-    files, offset, total_results = await next_back(all_files, max_results=10)
+    session = SearchSession(search, results)
+    files, offset, total_results = await get_session_page(session, max_results=10)
 
     btn = [[
         InlineKeyboardButton(
@@ -1139,11 +1160,8 @@ async def auto_filter(client, msg, spoll=False):
 
 
     key = f"{message.chat.id}-{message.id}"
-    BUTTONS[key] = search
+    SESSIONS.set(key, session)
     req = message.from_user.id if message.from_user else 0
-    ORIGINAL_FILES[key] = all_files
-    FILES[key] = all_files
-    SELECTIONS[key] = {'language': 'any', 'resolution': 'any', 'category': 'any'}
     
 
     if offset != "":
@@ -1,16 +1,33 @@
 """
 Simplified channel handler - Only checks 2 required channels
 """
+import asyncio
 import logging
-from hydrogram import Client, filters
+from hydrogram import Client, filters, enums
 from hydrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from hydrogram.errors import FloodWait, UserIsBlocked, PeerIdInvalid
+from hydrogram.errors import FloodWait, UserIsBlocked, PeerIdInvalid, UserNotParticipant
 from database.users_chats_db import db
 from language_config import REQUIRED_CHANNELS, get_required_channels
-from utils import is_subscribed, temp
+from utils import is_subscribed, temp, get_cached_membership, cache_membership, forget_non_membership, MEMBER_STATUSES
 
 logger = logging.getLogger(__name__)
 
+# Channels users must join
+REQUIRED_CHANNEL_IDS = [-1002766947260, -1002886647880]
+
+# For now, temporarily disable channel checking to allow bot to work
+# You can enable this after properly adding bot as admin to channels
+ENABLE_CHANNEL_CHECKING = False
+
+# The bot's own view of each required channel ({'accessible', 'admin', 'title',
+# 'username', 'join_url', 'members'}). It hardly ever changes, so it is read at
+# start and refreshed every CHANNEL_STATUS_REFRESH seconds instead of on every
+# check, and the join keyboard is built from it without any API call.
+CHANNEL_STATUS = {}
+CHANNEL_STATUS_REFRESH = 900
+# Seconds one user membership lookup may take before it counts as not joined
+MEMBER_CHECK_TIMEOUT = 5
+
 async def handle_channel_check(client: Client, user_id: int, context: str = "general"):
     """
     Centralized function to check channels and return appropriate response
@@ -43,74 +60,136 @@ async def check_user_channels(client: Client, user_id: int) -> tuple:
         return True, []
     
     # Get required channels - use specific channel IDs you provided
-    required_channel_ids = [-1002766947260, -1002886647880]
-    
-    # For now, temporarily disable channel checking to allow bot to work
-    # You can enable this after properly adding bot as admin to channels
-    ENABLE_CHANNEL_CHECKING = False
+    required_channel_ids = REQUIRED_CHANNEL_IDS
     
     if not ENABLE_CHANNEL_CHECKING:
         logger.info(f"Channel checking temporarily disabled - allowing user {user_id}")
         return True, []
     
     missing_channels = []
+    to_check = []
     logger.info(f"Checking channels for user {user_id}: {required_channel_ids}")
     
     for channel_id in required_channel_ids:
-        try:
-            # First verify bot can access the channel
-            try:
-                chat = await client.get_chat(channel_id)
-                logger.info(f"✅ Bot can access channel {channel_id}: {chat.title}")
-                
-                # Check bot's permissions in the channel
-                try:
-                    bot_member = await client.get_chat_member(channel_id, client.me.id)
-                    logger.info(f"Bot status in {channel_id}: {bot_member.status}")
-                    
-                    if bot_member.status not in ["creator", "administrator"]:
-                        logger.warning(f"⚠️ Bot is not admin in {channel_id}, cannot check memberships reliably")
-                        
-                except Exception as bot_check_error:
-                    logger.error(f"Cannot check bot status in {channel_id}: {bot_check_error}")
-                    
-            except Exception as chat_error:
-                logger.error(f"❌ Bot cannot access channel {channel_id}: {chat_error}")
-                # If bot can't access channel, skip checking for now
-                logger.warning(f"⚠️ Skipping channel {channel_id} due to access issues")
-                continue
-            
-            # Check if user is a member
-            try:
-                member = await client.get_chat_member(channel_id, user_id)
-                logger.info(f"User {user_id} status in {channel_id}: {member.status}")
-                
-                if member.status in ["creator", "administrator", "member"]:
-                    logger.info(f"✅ User {user_id} IS member of {channel_id}")
-                elif member.status == "left":
-                    logger.info(f"❌ User {user_id} has LEFT {channel_id}")
-                    missing_channels.append(channel_id)
-                elif member.status == "kicked":
-                    logger.info(f"❌ User {user_id} is BANNED from {channel_id}")
-                    missing_channels.append(channel_id)
-                else:
-                    logger.info(f"❌ User {user_id} NOT member of {channel_id} (status: {member.status})")
-                    missing_channels.append(channel_id)
-                    
-            except Exception as member_error:
-                logger.error(f"❌ Error checking user membership in {channel_id}: {member_error}")
-                # If we can't check membership, assume user needs to join
+        # Known from member updates or an earlier check: no API call
+        cached = get_cached_membership(user_id, channel_id)
+        if cached is not None:
+            if not cached:
                 missing_channels.append(channel_id)
-                
-        except Exception as e:
-            logger.error(f"❌ General error checking {channel_id} for user {user_id}: {e}")
-            missing_channels.append(channel_id)
+            continue
+        if CHANNEL_STATUS.get(channel_id, {}).get('accessible') is False:
+            # If bot can't access channel, skip checking for now
+            logger.warning(f"⚠️ Skipping channel {channel_id} due to access issues")
+            continue
+        to_check.append(channel_id)
+
+    # The rest are looked up together, so the wait is the slowest single lookup
+    results = await asyncio.gather(*(is_channel_member(client, user_id, channel_id) for channel_id in to_check))
+    missing_channels += [channel_id for channel_id, joined in zip(to_check, results) if not joined]
+    missing_channels.sort(key=required_channel_ids.index)
     
     is_all_subscribed = len(missing_channels) == 0
     logger.info(f"Final result for user {user_id}: subscribed={is_all_subscribed}, missing={missing_channels}")
     
     return is_all_subscribed, missing_channels
 
+async def is_channel_member(client: Client, user_id: int, channel_id: int) -> bool:
+    """Ask Telegram whether a user is in a channel; errors count as not joined"""
+    try:
+        member = await asyncio.wait_for(client.get_chat_member(channel_id, user_id), MEMBER_CHECK_TIMEOUT)
+    except UserNotParticipant:
+        logger.info(f"❌ User {user_id} NOT member of {channel_id}")
+        cache_membership(user_id, channel_id, False)
+        return False
+    except Exception as member_error:
+        # If we can't check membership, assume user needs to join
+        logger.error(f"❌ Error checking user membership in {channel_id}: {member_error!r}")
+        return False
+
+    logger.info(f"User {user_id} status in {channel_id}: {member.status}")
+    joined = member.status in MEMBER_STATUSES
+    cache_membership(user_id, channel_id, joined)
+    if joined:
+        logger.info(f"✅ User {user_id} IS member of {channel_id}")
+    elif member.status == enums.ChatMemberStatus.LEFT:
+        logger.info(f"❌ User {user_id} has LEFT {channel_id}")
+    elif member.status == enums.ChatMemberStatus.BANNED:
+        logger.info(f"❌ User {user_id} is BANNED from {channel_id}")
+    else:
+        logger.info(f"❌ User {user_id} NOT member of {channel_id} (status: {member.status})")
+    return joined
+
+async def refresh_channel_status(client: Client):
+    """Check that the bot can see each required channel and is admin there,
+    and note the title, join link and member count shown to users"""
+    for channel_id in REQUIRED_CHANNEL_IDS:
+        try:
+            chat = await client.get_chat(channel_id)
+        except Exception as chat_error:
+            logger.error(f"❌ Bot cannot access channel {channel_id}: {chat_error}")
+            CHANNEL_STATUS[channel_id] = {'accessible': False, 'admin': False, 'title': None, 'username': None,
+                                          'join_url': None, 'members': None}
+            continue
+
+        admin = False
+        try:
+            bot_member = await client.get_chat_member(channel_id, client.me.id)
+            admin = bot_member.status in (enums.ChatMemberStatus.OWNER, enums.ChatMemberStatus.ADMINISTRATOR)
+        except Exception as bot_check_error:
+            logger.error(f"Cannot check bot status in {channel_id}: {bot_check_error}")
+        if not admin:
+            logger.warning(f"⚠️ Bot is not admin in {channel_id}, cannot check memberships reliably")
+
+        members = chat.members_count
+        if members is None:
+            try:
+                members = await client.get_chat_members_count(channel_id)
+            except Exception:
+                pass
+
+        CHANNEL_STATUS[channel_id] = {
+            'accessible': True,
+            'admin': admin,
+            'title': chat.title,
+            'username': chat.username,
+            'join_url': await join_url(client, chat),
+            'members': members
+        }
+
+async def join_url(client: Client, chat) -> str:
+    """Link users follow to join a channel. A link made once is kept across
+    refreshes, so a new invite link is only minted when there is none yet"""
+    if chat.username:
+        return f"https://t.me/{chat.username}"
+    known = CHANNEL_STATUS.get(chat.id, {}).get('join_url')
+    if known:
+        return known
+    if chat.invite_link:
+        return chat.invite_link
+
+    try:
+        invite_link = await client.create_chat_invite_link(chat.id, creates_join_request=False)
+        logger.info(f"✅ Created invite link for {chat.id}")
+        return invite_link.invite_link
+    except Exception as e:
+        logger.warning(f"⚠️ Could not create invite link for {chat.id}: {e}")
+    try:
+        url = await client.export_chat_invite_link(chat.id)
+        logger.info(f"✅ Exported invite link for {chat.id}")
+        return url
+    except Exception as e:
+        logger.warning(f"⚠️ Failed to export invite link for {chat.id}: {e}")
+    return None
+
+async def watch_channel_status(client: Client):
+    """Keep CHANNEL_STATUS fresh for as long as the bot runs"""
+    while True:
+        try:
+            await refresh_channel_status(client)
+        except Exception as e:
+            logger.error(f"Error refreshing channel status: {e}")
+        await asyncio.sleep(CHANNEL_STATUS_REFRESH)
+
 async def create_join_buttons(client: Client, missing_channels: list) -> InlineKeyboardMarkup:
     """Create attractive numbered buttons for joining missing channels"""
     buttons = []
@@ -120,60 +199,25 @@ async def create_join_buttons(client: Client, missing_channels: list) -> InlineK
     
     for idx, channel_id in enumerate(missing_channels):
         emoji = channel_emojis[idx] if idx < len(channel_emojis) else "📢"
+        status = CHANNEL_STATUS.get(channel_id, {})
         
-        try:
-            # Try to get chat info
-            chat = await client.get_chat(channel_id)
-            chat_title = chat.title
-            logger.info(f"✅ Got chat info for {channel_id}: {chat_title}")
-            
-            # Try multiple methods to create working join links
-            join_url = None
-            
-            # Method 1: Try to create invite link
-            try:
-                invite_link = await client.create_chat_invite_link(channel_id, creates_join_request=False)
-                join_url = invite_link.invite_link
-                logger.info(f"✅ Created invite link for {channel_id}")
-            except Exception as e:
-                logger.warning(f"⚠️ Could not create invite link for {channel_id}: {e}")
-            
-            # Method 2: Try username if available
-            if not join_url and hasattr(chat, 'username') and chat.username:
-                join_url = f"https://t.me/{chat.username}"
-                logger.info(f"✅ Using username link for {channel_id}: @{chat.username}")
-            
-            # Method 3: Try export invite link
-            if not join_url:
-                try:
-                    join_url = await client.export_chat_invite_link(channel_id)
-                    logger.info(f"✅ Exported invite link for {channel_id}")
-                except Exception as e:
-                    logger.warning(f"⚠️ Failed to export invite link for {channel_id}: {e}")
-            
-            # Create button with working URL or callback
-            if join_url:
-                button_text = f"{emoji} [{idx + 1}] {chat_title}"
-                buttons.append([
-                    InlineKeyboardButton(button_text, url=join_url)
-                ])
-                logger.info(f"✅ Created join button for {channel_id} with URL")
-            else:
-                # No working URL found - use callback for manual instructions
-                button_text = f"{emoji} [{idx + 1}] {chat_title} (Contact Admin)"
-                buttons.append([
-                    InlineKeyboardButton(button_text, callback_data=f"manual_join_{channel_id}")
-                ])
-                logger.warning(f"⚠️ Created manual join button for {channel_id}")
-                        
-        except Exception as e:
-            logger.error(f"❌ Bot cannot access channel {channel_id}: {e}")
-            # Create fallback button for inaccessible channels
+        if status.get('join_url'):
+            button_text = f"{emoji} [{idx + 1}] {status['title']}"
+            buttons.append([
+                InlineKeyboardButton(button_text, url=status['join_url'])
+            ])
+        elif status.get('accessible'):
+            # No working URL found - use callback for manual instructions
+            button_text = f"{emoji} [{idx + 1}] {status['title']} (Contact Admin)"
+            buttons.append([
+                InlineKeyboardButton(button_text, callback_data=f"manual_join_{channel_id}")
+            ])
+        else:
+            # Create fallback button for inaccessible or not yet checked channels
             button_text = f"{emoji} [{idx + 1}] Join Channel (ID: {channel_id})"
             buttons.append([
                 InlineKeyboardButton(button_text, callback_data=f"manual_join_{channel_id}")
             ])
-            logger.warning(f"⚠️ Created fallback button for inaccessible channel {channel_id}")
     
     # Add some spacing and check again button with attractive styling
     buttons.append([])  # Empty row for spacing
@@ -198,6 +242,7 @@ async def check_channels_again(client: Client, query: CallbackQuery):
         
         # Check if user is now subscribed to all channels
         logger.info(f"🔄 Rechecking channels for user {user_id}")
+        forget_non_membership(user_id, REQUIRED_CHANNEL_IDS)
         is_subscribed, missing_channels = await check_user_channels(client, user_id)
         
         # Log the check result
@@ -239,16 +284,12 @@ async def check_channels_again(client: Client, query: CallbackQuery):
             
             # Get channel names for better UI
             channel_info = []
-            for i, channel_id in enumerate(missing_channels, 1):
-                try:
-                    chat = await client.get_chat(channel_id)
-                    member_count = ""
-                    try:
-                        member_count = f" • {await client.get_chat_members_count(channel_id)} members"
-                    except:
-                        pass
-                    channel_info.append(f"🔹 **{chat.title}**{member_count}")
-                except:
+            for channel_id in missing_channels:
+                status = CHANNEL_STATUS.get(channel_id, {})
+                if status.get('title'):
+                    member_count = f" • {status['members']} members" if status.get('members') else ""
+                    channel_info.append(f"🔹 **{status['title']}**{member_count}")
+                else:
                     channel_info.append(f"🔹 **Channel {channel_id}**")
             
             channels_text = "\n".join(channel_info)
@@ -283,17 +324,17 @@ async def manual_join_info(client: Client, query: CallbackQuery):
     try:
         channel_id = int(query.data.split("_")[2])
         
-        # Try to get channel info
-        try:
-            chat = await client.get_chat(channel_id)
-            channel_name = chat.title
+        # Channel info from the status cache
+        status = CHANNEL_STATUS.get(channel_id, {})
+        if status.get('accessible'):
+            channel_name = status['title']
             
             # Check if channel has username for direct link
-            if hasattr(chat, 'username') and chat.username:
+            if status['username']:
                 instructions = (
                     f"🔗 **Join {channel_name}**\n\n"
-                    f"📱 **Method 1:** Search @{chat.username} in Telegram\n"
-                    f"🌐 **Method 2:** Visit https://t.me/{chat.username}\n\n"
+                    f"📱 **Method 1:** Search @{status['username']} in Telegram\n"
+                    f"🌐 **Method 2:** Visit https://t.me/{status['username']}\n\n"
                     f"After joining, return here and click '🔄 Check Again' to continue."
                 )
             else:
@@ -303,7 +344,7 @@ async def manual_join_info(client: Client, query: CallbackQuery):
                     f"Please contact the admin to get the channel invite link, "
                     f"then return here and click '🔄 Check Again'."
                 )
-        except:
+        else:
             instructions = (
                 f"📢 **Channel Access Required**\n\n"
                 f"🆔 **Channel ID:** {channel_id}\n\n"
@@ -0,0 +1,147 @@
+import time
+import asyncio
+import contextvars
+from contextlib import contextmanager
+from cache import LRUCache
+
+# Priority of the Telegram calls made by the current task. Background work
+# (broadcasts, indexing, catch-up) runs under background() and leaves part of
+# the global budget to interactive traffic such as search replies.
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY = contextvars.ContextVar('telegram_priority', default=INTERACTIVE)
+
+# Methods that post into a chat are also limited per chat
+CHAT_METHOD_PREFIXES = ('Send', 'Edit', 'Forward', 'Delete')
+
+
+@contextmanager
+def background():
+    """Mark the Telegram calls made inside the block as background traffic"""
+    token = PRIORITY.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        PRIORITY.reset(token)
+
+
+class TokenBucket:
+    """Token bucket whose rate halves on FloodWait and creeps back afterwards
+
+    The rate recovers by ``recovery`` of its base rate per second, so a bucket
+    halved by a FloodWait is back to full speed in ``0.5 / recovery`` seconds.
+    """
+
+    def __init__(self, rate, capacity, recovery=0.01, min_rate=0.05):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.recovery = recovery
+        self.min_rate = min_rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate + self.base_rate * self.recovery * elapsed)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        return now
+
+    def wait_time(self, reserve=0):
+        """Seconds until a token is available with ``reserve`` tokens left over"""
+        now = self._refill()
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        missing = 1 + reserve - self.tokens
+        return missing / self.rate if missing > 0 else 0
+
+    def take(self):
+        self.tokens -= 1
+
+    def penalize(self, seconds):
+        """Stop for the FloodWait and continue at half the rate"""
+        self._refill()
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    """Global, per-method and per-chat token buckets shared by every caller"""
+
+    def __init__(self, rate, chat_rate, reserve=0.3, max_chats=10000):
+        self.rate = rate
+        self.chat_rate = chat_rate
+        self.global_bucket = TokenBucket(rate, rate)
+        # Background calls leave this many global tokens for interactive ones
+        self.reserve = rate * reserve
+        self.methods = {}
+        self.chats = LRUCache('rate_limit_chats', max_chats)
+        self.waiting = 0
+
+    def _buckets(self, method, chat):
+        method_bucket = self.methods.get(method)
+        if method_bucket is None:
+            method_bucket = self.methods[method] = TokenBucket(self.rate, self.rate)
+        buckets = [method_bucket]
+        if chat is not None and method.startswith(CHAT_METHOD_PREFIXES):
+            chat_bucket = self.chats.get(chat)
+            if chat_bucket is None:
+                chat_bucket = TokenBucket(self.chat_rate, 3)
+                self.chats.set(chat, chat_bucket)
+            buckets.append(chat_bucket)
+        return buckets
+
+    async def acquire(self, method, chat=None):
+        """Wait until a call of method into chat fits every bucket"""
+        interactive = PRIORITY.get() == INTERACTIVE
+        buckets = self._buckets(method, chat)
+        if interactive:
+            self.waiting += 1
+        try:
+            while True:
+                # Background calls also wait while interactive ones are queued
+                reserve = 0 if interactive else self.reserve
+                wait = max(bucket.wait_time() for bucket in buckets)
+                wait = max(wait, self.global_bucket.wait_time(reserve))
+                if not wait and not interactive and self.waiting:
+                    wait = 1 / self.rate
+                if not wait:
+                    break
+                await asyncio.sleep(wait)
+        finally:
+            if interactive:
+                self.waiting -= 1
+        self.global_bucket.take()
+        for bucket in buckets:
+            bucket.take()
+
+    def penalize(self, method, chat, seconds):
+        """Slow down whatever a FloodWait of seconds was raised for"""
+        buckets = self._buckets(method, chat)
+        # A FloodWait on a chat method is that chat's limit; the other chats
+        # keep going at the method's full rate
+        buckets[-1].penalize(seconds)
+
+    def stats(self):
+        return {
+            'rate': round(self.global_bucket.rate, 2),
+            'waiting': self.waiting,
+            'slowed_methods': sorted(
+                method for method, bucket in self.methods.items() if bucket.rate < bucket.base_rate
+            ),
+        }
+
+
+def peer_id(query):
+    """Chat a raw API query targets, None if it has no peer"""
+    peer = getattr(query, 'peer', None) or getattr(query, 'channel', None)
+    for attr in ('user_id', 'channel_id', 'chat_id'):
+        value = getattr(peer, attr, None)
+        if value is not None:
+            return value
+    return None
@@ -22,11 +22,11 @@ async def test_movie_system():
     print("\n1. Checking Database Content:")
     print("-" * 30)
     try:
-        total_movies = primary_col.count_documents({})
+        total_movies = await primary_col.count_documents({})
         print(f"   Total movies in database: {total_movies}")
         
         # Get sample movies
-        sample_movies = list(primary_col.find().limit(5))
+        sample_movies = await primary_col.find().limit(5).to_list(length=None)
         print(f"   Sample movies:")
         for movie in sample_movies:
             print(f"     • {movie.get('file_name', 'Unknown')} ({movie.get('file_size', 0)} bytes)")
@@ -53,7 +53,7 @@ async def test_movie_system():
     print("-" * 30)
     try:
         # Get a sample file ID
-        sample_file = primary_col.find_one()
+        sample_file = await primary_col.find_one()
         if sample_file:
             file_id = sample_file['_id']
             print(f"   Testing file ID: {file_id}")
@@ -75,17 +75,17 @@ async def test_movie_system():
     print("-" * 30)
     try:
         # Test with existing file
-        sample_file = primary_col.find_one()
+        sample_file = await primary_col.find_one()
         if sample_file:
             existing_name = sample_file['file_name']
             existing_id = sample_file['_id']
             
             # Check duplicate by name
-            duplicate_by_name = primary_col.find_one({'file_name': existing_name})
+            duplicate_by_name = await primary_col.find_one({'file_name': existing_name})
             print(f"   Duplicate check by name: {'✅ Working' if duplicate_by_name else '❌ Failed'}")
             
             # Check duplicate by ID
-            duplicate_by_id = primary_col.find_one({'_id': existing_id})
+            duplicate_by_id = await primary_col.find_one({'_id': existing_id})
             print(f"   Duplicate check by ID: {'✅ Working' if duplicate_by_id else '❌ Failed'}")
         else:
             print(f"   No files to test duplicates with")
@@ -96,7 +96,7 @@ async def test_movie_system():
     print("\n5. Testing File ID Formats:")
     print("-" * 30)
     try:
-        sample_files = list(primary_col.find().limit(3))
+        sample_files = await primary_col.find().limit(3).to_list(length=None)
         for i, file_info in enumerate(sample_files, 1):
             file_id = file_info['_id']
             print(f"   File {i} ID: {file_id} (Type: {type(file_id)})")
@@ -2,7 +2,7 @@ import logging
 from hydrogram.errors import InputUserDeactivated, UserNotParticipant, FloodWait, UserIsBlocked, PeerIdInvalid
 
 logger = logging.getLogger(__name__)
-from info import AUTH_CHANNEL, LONG_IMDB_DESCRIPTION, MAX_LIST_ELM
+from info import AUTH_CHANNEL, LONG_IMDB_DESCRIPTION, MAX_LIST_ELM, MEMBERSHIP_CACHE_SIZE, MEMBER_CACHE_TTL, NON_MEMBER_CACHE_TTL
 from imdb import Cinemagoer
 import asyncio
 from hydrogram.types import Message, InlineKeyboardButton
@@ -13,6 +13,7 @@ import os
 from datetime import datetime
 from typing import List
 from database.users_chats_db import db
+from cache import LRUCache
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -59,6 +60,74 @@ def format_size(size_str):
     else:
         return size_str.replace(" ", "")  # Fallback (remove spaces if any)
     
+# Membership per (user_id, channel). Members are remembered for
+# MEMBER_CACHE_TTL, non-members only for NON_MEMBER_CACHE_TTL so someone who
+# just joined gets in quickly; chat member and join request updates replace
+# entries as they happen.
+MEMBERSHIP = LRUCache('membership', MEMBERSHIP_CACHE_SIZE)
+MEMBER_STATUSES = (
+    enums.ChatMemberStatus.OWNER, enums.ChatMemberStatus.ADMINISTRATOR,
+    enums.ChatMemberStatus.MEMBER, enums.ChatMemberStatus.RESTRICTED
+)
+
+
+# Membership learned from chat member updates (and the startup bootstrap),
+# channel -> {user_id: is_member}. It has no expiry and is saved to the
+# database to survive restarts. Only members are taken as final: a user who
+# left may rejoin while the bot is offline and the update is lost, so a
+# non-member is only remembered for NON_MEMBER_CACHE_TTL. Join requests stay
+# out of it, since a declined request sends no update.
+MEMBER_TABLE = {}
+
+
+def get_cached_membership(user_id, channel):
+    """True/False when the membership is known, None otherwise"""
+    if MEMBER_TABLE.get(channel, {}).get(user_id):
+        return True
+    return MEMBERSHIP.get((user_id, channel))
+
+
+async def record_membership(user_id, channel, is_member):
+    """Store a membership change reported by Telegram"""
+    MEMBER_TABLE.setdefault(channel, {})[user_id] = is_member
+    if is_member:
+        MEMBERSHIP.pop((user_id, channel))
+    else:
+        cache_membership(user_id, channel, False)
+    await db.update_member(channel, user_id, is_member)
+
+
+async def load_membership():
+    """Fill MEMBER_TABLE from the database"""
+    count = 0
+    async for record in db.get_members():
+        MEMBER_TABLE.setdefault(record['chat'], {})[record['user']] = record['member']
+        count += 1
+    logger.info(f"Loaded {count} channel memberships")
+
+
+def cache_membership(user_id, channel, is_member):
+    ttl = MEMBER_CACHE_TTL if is_member else NON_MEMBER_CACHE_TTL
+    MEMBERSHIP.set((user_id, channel), is_member, ttl=ttl)
+
+
+async def forget_join_requests(user_ids, channels):
+    """Take back the access join requests gave (the /delreq reset)"""
+    for channel in channels:
+        table = MEMBER_TABLE.get(channel, {})
+        for user_id in user_ids:
+            MEMBERSHIP.pop((user_id, channel))
+            table.pop(user_id, None)
+        await db.del_members(channel, user_ids)
+
+
+def forget_non_membership(user_id, channels):
+    """Drop cached 'not joined' answers so an explicit re-check asks Telegram"""
+    for channel in channels:
+        if MEMBERSHIP.get((user_id, channel)) is False:
+            MEMBERSHIP.pop((user_id, channel))
+
+
 async def is_subscribed(bot, query, channel):
     # Handle different parameter types
     if hasattr(query, 'from_user'):
@@ -68,18 +137,27 @@ async def is_subscribed(bot, query, channel):
     
     if await db.find_join_req(user_id):
         return True
+
+    cached = get_cached_membership(user_id, channel)
+    if cached is not None:
+        return cached
     
     # Add retry mechanism for channel membership check
     for attempt in range(3):  # Try 3 times
         try:
             user = await bot.get_chat_member(channel, user_id)
-            logger.info(f"✅ User {user_id} is subscribed to channel {channel}")
-            return True
+            # Users who left or were banned come back as a member with that status
+            subscribed = user.status in MEMBER_STATUSES
+            if subscribed:
+                logger.info(f"✅ User {user_id} is subscribed to channel {channel}")
+            else:
+                logger.info(f"❌ User {user_id} not subscribed to channel {channel} (status: {user.status})")
+            cache_membership(user_id, channel, subscribed)
+            return subscribed
         except UserNotParticipant:
-            logger.info(f"❌ User {user_id} not participant in channel {channel} (attempt {attempt + 1})")
-            if attempt < 2:  # If not the last attempt, wait and retry
-                await asyncio.sleep(1)  # Wait 1 second before retry
-                continue
+            # A definite answer, retrying would not change it
+            logger.info(f"❌ User {user_id} not participant in channel {channel}")
+            cache_membership(user_id, channel, False)
             return False
         except Exception as e:
             # Handle invalid channel IDs or other errors
@@ -176,7 +254,8 @@ async def broadcast_messages(user_id, message):
         await message.copy(chat_id=user_id)
         return True, "Success"
     except FloodWait as e:
-        await asyncio.sleep(e.x)
+        # The bot's limiter has already slowed copies down for this
+        await asyncio.sleep(e.value)
         return await broadcast_messages(user_id, message)
     except InputUserDeactivated:
         await db.delete_user(int(user_id))